@@ -0,0 +1,54 @@
+from argparse import ArgumentParser
+from time import perf_counter
+
+import torch
+import torch.nn.functional as F
+
+from physics.blur import depthwise_conv
+from physics.kernels import get_kernel
+
+parser = ArgumentParser()
+parser.add_argument("--kernel", type=str, default="Gaussian_R2")
+parser.add_argument("--size", type=int, default=256)
+parser.add_argument("--channels", type=int, default=3)
+parser.add_argument("--batch_sizes", type=str, default="1,2,4,8,16,32,64")
+parser.add_argument("--repeats", type=int, default=5)
+parser.add_argument("--device", type=str, default="cpu")
+args = parser.parse_args()
+
+kernel = get_kernel(args.kernel).unsqueeze(0).unsqueeze(0).to(args.device)
+kernel = kernel.to(torch.float)
+
+
+def measure(fn):
+    fn()
+    if torch.device(args.device).type == "cuda":
+        torch.cuda.synchronize()
+    start = perf_counter()
+    for _ in range(args.repeats):
+        fn()
+    if torch.device(args.device).type == "cuda":
+        torch.cuda.synchronize()
+    return (perf_counter() - start) / args.repeats
+
+
+# NOTE: The baseline filters the channels of the images one by one, like the
+# loops which conv and conv_transpose used to run.
+def per_slice(x, transpose):
+    fn = F.conv_transpose2d if transpose else F.conv2d
+    b, c = x.shape[:2]
+    return [fn(x[i : i + 1, j : j + 1], kernel) for i in range(b) for j in range(c)]
+
+
+print("batch_size, operator, per_slice (ms), batched (ms), speedup")
+for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+    x = torch.rand(
+        batch_size, args.channels, args.size, args.size, device=args.device
+    )
+    for name, transpose in [("conv", False), ("conv_transpose", True)]:
+        with torch.no_grad():
+            t_per_slice = measure(lambda: per_slice(x, transpose))
+            t_batched = measure(lambda: depthwise_conv(x, kernel, transpose))
+        print(
+            f"{batch_size}, {name}, {1000 * t_per_slice:.2f}, {1000 * t_batched:.2f}, {t_per_slice / t_batched:.1f}x"
+        )
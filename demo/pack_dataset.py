@@ -0,0 +1,39 @@
+from argparse import ArgumentParser
+
+from datasets.ground_truth import GroundTruthDataset
+from datasets.shards import pack_shards
+
+parser = ArgumentParser()
+parser.add_argument("--dataset", type=str, default="div2k")
+parser.add_argument("--split", type=str, default="train")
+parser.add_argument("--datasets_dir", type=str, default="./datasets")
+parser.add_argument("--shard_size", type=int, default=2**30)
+parser.add_argument("--dtype", type=str, default="uint8")
+parser.add_argument("--download", action="store_true")
+args = parser.parse_args()
+
+# NOTE: The images are packed before resizing so that the shards can be used
+# with any size.
+ground_truth_dataset = GroundTruthDataset(
+    blueprint={},
+    datasets_dir=args.datasets_dir,
+    dataset_name=args.dataset,
+    split=args.split,
+    download=args.download,
+    size=None,
+    memoize_gt=False,
+    memoize_backend=None,
+    memoize_max_bytes=None,
+    disk_cache=False,
+    disk_cache_dtype=None,
+    sharded=False,
+)
+
+root = f"{args.datasets_dir}/shards/{args.dataset.lower()}/{args.split}"
+print(f"writing the shards to the directory {root}")
+pack_shards(
+    ground_truth_dataset.dataset,
+    root=root,
+    shard_size=args.shard_size,
+    dtype=args.dtype,
+)
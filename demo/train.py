@@ -45,6 +45,12 @@ parser.add_argument(
 )
 parser.add_argument("--ProposedLoss__sure_alternative", type=str, default=None)
 parser.add_argument("--ProposedLoss__alpha_tradeoff", type=float, default=1.0)
+parser.add_argument(
+    "--ProposedLoss__fuse_model_calls", action=BooleanOptionalAction, default=False
+)
+parser.add_argument(
+    "--ProposedLoss__time_model_calls", action=BooleanOptionalAction, default=False
+)
 parser.add_argument("--ScalingTransform__kind", type=str, default="padded")
 parser.add_argument(
     "--ScalingTransform__antialias", action=BooleanOptionalAction, default=False
@@ -59,6 +65,8 @@ parser.add_argument("--sure_cropped_div", action=BooleanOptionalAction, default=
 parser.add_argument("--sure_averaged_cst", action=BooleanOptionalAction, default=None)
 parser.add_argument("--partial_sure_sr", action=BooleanOptionalAction, default=False)
 parser.add_argument("--sure_margin", type=int, default=None)
+parser.add_argument("--sure_probes", type=int, default=1)
+parser.add_argument("--sure_batched_probes", action=BooleanOptionalAction, default=False)
 parser.add_argument("--lr_scheduler_kind", type=str, default="delayed_linear_decay")
 parser.add_argument("--optimizer_beta2", type=float, default=0.999)
 parser.add_argument(
@@ -67,6 +75,11 @@ parser.add_argument(
     default=True,
 )
 parser.add_argument("--GroundTruthDataset__split", type=str, default="train")
+parser.add_argument(
+    "--TrainingDataset__crop_before_degradation",
+    action=BooleanOptionalAction,
+    default=False,
+)
 parser.add_argument("--weights", type=str, default=None)
 parser.add_argument("--lr", type=float, default=None)
 parser.add_argument("--optimizer", type=str, default=None)
@@ -74,10 +87,33 @@ parser.add_argument("--fine_tuning", action=BooleanOptionalAction, default=False
 parser.add_argument("--fine_tuning_params", action=BooleanOptionalAction, default=False)
 parser.add_argument("--weights_distance_loss", action=BooleanOptionalAction, default=False)
 parser.add_argument("--RESUME", type=str, default=None)
+# NOTE: If the number of workers is set, even to zero, the training pairs are
+# synthesized on the CPU and only moved to the device in the training loop.
+parser.add_argument("--DataLoader__num_workers", type=int, default=None)
+parser.add_argument("--DataLoader__prefetch_factor", type=int, default=2)
+# NOTE: Streaming requires the ground truth images to be sharded.
+parser.add_argument(
+    "--DataLoader__stream_shards", action=BooleanOptionalAction, default=False
+)
+parser.add_argument("--DataLoader__shuffle_buffer_size", type=int, default=64)
 args = parser.parse_args()
 
 physics = get_physics(args, device=args.device)
 
+# NOTE: The losses other than the supervised one use the operator of the
+# first kernel only.
+if getattr(physics, "__manager").kernel_sampler is not None:
+    assert args.method == "supervised", "Sampling kernels is only supported for supervised training"
+
+if args.DataLoader__num_workers is not None:
+    dataset_device = "cpu"
+    # The operator used to synthesize the training pairs must live on the
+    # same device as the dataset.
+    dataset_physics = get_physics(args, device=dataset_device)
+else:
+    dataset_device = args.device
+    dataset_physics = physics
+
 model = get_model(
     args=args,
     physics=physics,
@@ -102,7 +138,7 @@ if isdir(args.dataset):
     dataset = []
     for i, f in enumerate(glob(os.path.join(args.dataset, "*.png"))):
         y = read_image(f)
-        y = y.to(args.device)
+        y = y.to(dataset_device)
         y = y.float() / 255.0
         # Discard the alpha channel if it exists
         y = y[:3, :, :]
@@ -120,11 +156,42 @@ else:
 
     dataset = get_dataset(args=args,
                           purpose="train",
-                          physics=physics,
-                          device=args.device,
+                          physics=dataset_physics,
+                          device=dataset_device,
                           _HOTFIX=_HOTFIX)
 
-dataloader = DataLoader(dataset, batch_size=args.batch_size, shuffle=True)
+if args.DataLoader__stream_shards:
+    from datasets.shards import ShardStream
+
+    dataset = ShardStream(
+        dataset=dataset,
+        sharded_dataset=dataset.get_sharded_dataset(),
+        shuffle_buffer_size=args.DataLoader__shuffle_buffer_size,
+    )
+    # the stream is shuffled on its own
+    shuffle = False
+else:
+    shuffle = True
+
+if args.DataLoader__num_workers is not None and args.DataLoader__num_workers > 0:
+    dataloader_kwargs = {
+        "num_workers": args.DataLoader__num_workers,
+        "persistent_workers": True,
+        "prefetch_factor": args.DataLoader__prefetch_factor,
+    }
+else:
+    dataloader_kwargs = {}
+
+# NOTE: Pinned memory makes it possible for host to device copies to be
+# asynchronous.
+pin_memory = dataset_device == "cpu" and torch.device(args.device).type == "cuda"
+dataloader = DataLoader(
+    dataset,
+    batch_size=args.batch_size,
+    shuffle=shuffle,
+    pin_memory=pin_memory,
+    **dataloader_kwargs,
+)
 
 # NOTE: It'd be better to have a more general formula depending on the length
 # of the dataset instead of hardcoding these values.
@@ -256,7 +323,8 @@ for epoch in range(epochs):
 
     # a single epoch
     for x, y in dataloader:
-        x, y = x.to(args.device), y.to(args.device)
+        x = x.to(args.device, non_blocking=True)
+        y = y.to(args.device, non_blocking=True)
         optimizer.zero_grad()
 
         training_loss = loss(x=x, y=y, model=model)
@@ -280,6 +348,34 @@ for epoch in range(epochs):
         f"\t{current_timestamp}\t[{epoch + 1:{epochs_ndigits}d}/{epochs}]\tTraining_Loss: {epoch_training_loss:.2e}"
     )
 
+    # NOTE: With the memory backend, the statistics only account for the
+    # current process and not for the DataLoader workers.
+    if hasattr(dataset, "get_memoization_stats"):
+        memoization_stats = dataset.get_memoization_stats()
+        if memoization_stats is not None:
+            print(
+                f"\tMemoization: {memoization_stats['hits']} hits, {memoization_stats['misses']} misses, {memoization_stats['entries']} entries, {memoization_stats['bytes']} bytes"
+            )
+
+    # NOTE: The statistics only account for the current process as well.
+    if hasattr(physics, "get_cache_stats"):
+        cache_stats = physics.get_cache_stats()
+        print(
+            f"\tOperator cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries"
+        )
+
+    # NOTE: The timings are cumulative and they only account for the forward
+    # passes of the model and of the operator.
+    call_stats = loss.get_call_stats()
+    if call_stats is not None:
+        for key, entry in call_stats.items():
+            if "seconds" in entry:
+                print(
+                    f"\tCalls ({key}): {entry['calls']} calls, {entry['seconds']:.2f} s, {entry['seconds'] / entry['calls'] * 1000:.1f} ms per call"
+                )
+            else:
+                print(f"\tCalls ({key}): {entry['calls']} calls")
+
     # update the training record
     row = [
         epoch + 1,
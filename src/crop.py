@@ -22,12 +22,7 @@ class CropPair(Module):
         T_pad_y = MinSizePadding(self.size, padding_mode="constant", fill=0)
         y = T_pad_y(y)
         h, w = y.shape[-2:]
-        if self.location == "random":
-            i = torch.randint(0, h - self.size + 1, size=(1,)).item()
-            j = torch.randint(0, w - self.size + 1, size=(1,)).item()
-        elif self.location == "center":
-            i = (h - self.size) // 2
-            j = (w - self.size) // 2
+        i, j = self.sample_location(h, w)
         x_crop = TF.crop(
             x,
             top=i * xy_size_ratio,
@@ -38,6 +33,48 @@ class CropPair(Module):
         y_crop = TF.crop(y, top=i, left=j, height=self.size, width=self.size)
         return x_crop, y_crop
 
+    # NOTE: This is equivalent to cropping the pairs (x, y[k]) one by one
+    # using forward, but the crops are all gathered at once. The ground truth
+    # image x is shared by all the pairs. The locations of the crops in the
+    # padded measurements can be given, e.g. if they must be sampled in a
+    # certain order, see get_padded_size.
+    def crop_batch(self, x, y, xy_size_ratio, locations=None):
+        r = xy_size_ratio
+        T_pad_x = MinSizePadding(self.size * r, padding_mode="constant", fill=0)
+        x = T_pad_x(x)
+        T_pad_y = MinSizePadding(self.size, padding_mode="constant", fill=0)
+        y = T_pad_y(y)
+        h, w = y.shape[-2:]
+        if locations is None:
+            locations = [self.sample_location(h, w) for _ in range(y.shape[0])]
+        locations = torch.tensor(locations, device=y.device)
+
+        offsets = torch.arange(self.size, device=y.device)
+        rows = locations[:, 0, None] + offsets
+        cols = locations[:, 1, None] + offsets
+        batch = torch.arange(y.shape[0], device=y.device)[:, None, None]
+        y_crops = y.permute(0, 2, 3, 1)[batch, rows[:, :, None], cols[:, None, :]]
+        y_crops = y_crops.permute(0, 3, 1, 2)
+
+        offsets = torch.arange(self.size * r, device=x.device)
+        rows = locations[:, 0, None].to(x.device) * r + offsets
+        cols = locations[:, 1, None].to(x.device) * r + offsets
+        x_crops = x.permute(1, 2, 0)[rows[:, :, None], cols[:, None, :]]
+        x_crops = x_crops.permute(0, 3, 1, 2)
+        return x_crops, y_crops
+
+    def get_padded_size(self, h, w):
+        return max(h, self.size), max(w, self.size)
+
+    def sample_location(self, h, w):
+        if self.location == "random":
+            i = torch.randint(0, h - self.size + 1, size=(1,)).item()
+            j = torch.randint(0, w - self.size + 1, size=(1,)).item()
+        elif self.location == "center":
+            i = (h - self.size) // 2
+            j = (w - self.size) // 2
+        return i, j
+
 
 class MinSizePadding(Module):
     def __init__(self, size, padding_mode="constant", fill=0):
@@ -47,8 +84,8 @@ class MinSizePadding(Module):
         self.fill = fill
 
     def forward(self, x):
-        h_padding = max(0, self.size - x.shape[1])
-        w_padding = max(0, self.size - x.shape[2])
+        h_padding = max(0, self.size - x.shape[-2])
+        w_padding = max(0, self.size - x.shape[-1])
         return TF.pad(
             x,
             [0, 0, w_padding, h_padding],
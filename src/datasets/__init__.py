@@ -1,3 +1,4 @@
+import torch
 from torch.nn import Module
 from torch.utils.data import Dataset as BaseDataset
 from torchvision.transforms import functional as TF
@@ -7,6 +8,8 @@ from noise2inverse import Noise2InverseTransform
 from .ground_truth import GroundTruthDataset
 from .synthetic_dataset import SyntheticDataset
 from .single_image import SingleImageDataset
+from .tomography import TomographyDataset
+from .shards import ShardedDataset
 
 
 # NOTE: Getting small random crops should be optional and it should
@@ -54,10 +57,12 @@ class TrainingDataset(BaseDataset):
         css,
         noise2inverse,
         prepare_training_pairs,
+        crop_before_degradation,
         _HOTFIX,
     ):
         super().__init__()
         self.synthetic_dataset = synthetic_dataset
+        self.crop_before_degradation = crop_before_degradation
         self.physics = physics
         self.css = css
         self.noise2inverse = noise2inverse
@@ -65,8 +70,87 @@ class TrainingDataset(BaseDataset):
         self.important_unnamed_flag = _HOTFIX
 
     def __getitem__(self, index):
+        if self.crops_before_degradation():
+            return self.get_patch(index)
+
         x, y = self.synthetic_dataset[index]
+        return self.prepare_pair(x, y)
+
+    # NOTE: This is used by DataLoader to fetch whole batches at once.
+    def __getitems__(self, indices):
+        if self.crops_single_image():
+            return self.get_single_image_patches(indices)
+
+        if self.crops_before_degradation():
+            return [self.get_patch(index) for index in indices]
+
+        pairs = self.synthetic_dataset.get_batch(indices)
+        return [self.prepare_pair(x, y) for x, y in pairs]
 
+    def crops_before_degradation(self):
+        from os import environ
+        return (
+            self.crop_before_degradation
+            and not self.css
+            and "HOMOGENEOUS_SWINIR" not in environ
+        )
+
+    def crops_single_image(self):
+        from os import environ
+        return (
+            self.synthetic_dataset.is_single_image()
+            and not self.css
+            and "HOMOGENEOUS_SWINIR" not in environ
+        )
+
+    # NOTE: This must be kept consistent with prepare_pair.
+    def get_crop_parameters(self):
+        if self.important_unnamed_flag:
+            size = 48
+            location = "random"
+            xy_size_ratio = self.physics.rate
+        else:
+            size = self.prepare_training_pairs.crop_size
+            location = self.prepare_training_pairs.crop_location
+            if self.physics.task == "sr":
+                xy_size_ratio = self.physics.rate
+            else:
+                xy_size_ratio = 1
+        return size, location, xy_size_ratio
+
+    def get_patch(self, index):
+        size, location, xy_size_ratio = self.get_crop_parameters()
+        return self.synthetic_dataset.get_patch(
+            index, size=size, location=location, xy_size_ratio=xy_size_ratio
+        )
+
+    # NOTE: The crops of the single image are all gathered at once. If the
+    # noise is drawn from the global RNG, the noise of every pair is drawn
+    # before the location of its crop is sampled, as when the pairs are
+    # obtained one by one, for the random numbers to be drawn in the same
+    # order.
+    def get_single_image_patches(self, indices):
+        size, location, xy_size_ratio = self.get_crop_parameters()
+        T_crop = CropPair(location=location, size=size)
+        if self.synthetic_dataset.deterministic_measurements:
+            x, y = self.synthetic_dataset.get_single_image_batch(indices)
+            x, y = T_crop.crop_batch(x, y, xy_size_ratio=xy_size_ratio)
+            return list(zip(x, y))
+
+        ys = []
+        locations = []
+        for index in indices:
+            x, y = self.synthetic_dataset.get_single_image_batch([index])
+            ys.append(y)
+            h, w = T_crop.get_padded_size(*y.shape[-2:])
+            locations.append(T_crop.sample_location(h, w))
+        y = torch.cat(ys)
+        x, y = T_crop.crop_batch(
+            x, y, xy_size_ratio=xy_size_ratio, locations=locations
+        )
+        return list(zip(x, y))
+
+    def prepare_pair(self, x, y):
         if self.css:
             physics_manager = getattr(self.physics, "__manager")
             y = y.unsqueeze(0)
@@ -107,7 +191,13 @@ class TestDataset(BaseDataset):
 
     def __getitem__(self, index):
         x, y = self.synthetic_dataset[index]
+        return self.prepare_pair(x, y)
+
+    def __getitems__(self, indices):
+        pairs = self.synthetic_dataset.get_batch(indices)
+        return [self.prepare_pair(x, y) for x, y in pairs]
 
+    def prepare_pair(self, x, y):
         # NOTE: This should ideally be removed.
         if self.noise2inverse:
             # bug fix: make y have even height and width
@@ -164,7 +254,8 @@ class Dataset(BaseDataset):
                 css=css,
                 noise2inverse=noise2inverse,
                 prepare_training_pairs=prepare_training_pairs,
-                _HOTFIX=_HOTFIX
+                _HOTFIX=_HOTFIX,
+                **blueprint[TrainingDataset.__name__],
             )
         elif purpose == "test":
             self.dataset = TestDataset(
@@ -181,6 +272,17 @@ class Dataset(BaseDataset):
     def __getitem__(self, index):
         return self.dataset[index]
 
+    def __getitems__(self, indices):
+        return self.dataset.__getitems__(indices)
+
+    def get_memoization_stats(self):
+        return self.dataset.synthetic_dataset.get_memoization_stats()
+
+    def get_sharded_dataset(self):
+        dataset = self.dataset.synthetic_dataset.ground_truth_dataset.dataset
+        assert isinstance(dataset, ShardedDataset), "The dataset is not sharded"
+        return dataset
+
 
 def get_dataset(args, purpose, physics, device, _HOTFIX):
     if purpose == "test":
@@ -204,6 +306,11 @@ def get_dataset(args, purpose, physics, device, _HOTFIX):
         "size": args.GroundTruthDataset__size,
         "split": args.GroundTruthDataset__split,
         "memoize_gt": args.memoize_gt,
+        "memoize_backend": args.GroundTruthDataset__memoize_backend,
+        "memoize_max_bytes": args.GroundTruthDataset__memoize_max_bytes,
+        "disk_cache": args.GroundTruthDataset__disk_cache,
+        "disk_cache_dtype": args.GroundTruthDataset__disk_cache_dtype,
+        "sharded": args.GroundTruthDataset__sharded,
     }
 
     blueprint[PrepareTrainingPairs.__name__] = {
@@ -211,14 +318,28 @@ def get_dataset(args, purpose, physics, device, _HOTFIX):
         "crop_location": args.PrepareTrainingPairs__crop_location,
     }
 
+    # NOTE: The arguments are only defined for training.
+    blueprint[TrainingDataset.__name__] = {
+        "crop_before_degradation": getattr(
+            args, "TrainingDataset__crop_before_degradation", False
+        ),
+    }
+
     blueprint[SingleImageDataset.__name__] = {
         "image_path": args.SingleImageDataset__image_path,
         "duplicates_count": args.SingleImageDataset__duplicates_count,
     }
 
+    blueprint[TomographyDataset.__name__] = {
+        "slab_size": args.TomographyDataset__slab_size,
+        "slab_cache_size": args.TomographyDataset__slab_cache_size,
+    }
+
     blueprint[SyntheticDataset.__name__] = {
         "unique_seeds": args.SyntheticDataset__unique_seeds,
         "deterministic_measurements": args.SyntheticDataset__deterministic_measurements,
+        "batched_degradation": args.SyntheticDataset__batched_degradation,
+        "precomputed_measurements": args.SyntheticDataset__precomputed_measurements,
     }
 
     return Dataset(
@@ -0,0 +1,62 @@
+import numpy as np
+import torch
+
+from os import getpid, makedirs, replace
+from os.path import exists
+
+
+class DiskCache:
+    # NOTE: Entries are stored as .npy files which are memory-mapped when read
+    # back, meaning that reading an entry doesn't copy it and that the
+    # processes reading the same entry (e.g. DataLoader workers) share the
+    # same pages in memory.
+    def __init__(self, root, dtype="float32"):
+        assert dtype in ["float32", "uint8"], f"Unsupported dtype: {dtype}"
+        self.root = root
+        self.dtype = dtype
+        makedirs(self.root, exist_ok=True)
+
+    def get_path(self, key):
+        return f"{self.root}/{key}.npy"
+
+    # NOTE: If a region is given, i.e. the rows and the columns to keep, only
+    # the pages of the file containing these are read.
+    def get(self, key, region=None):
+        path = self.get_path(key)
+        if not exists(path):
+            return None
+
+        # NOTE: The mapping is copy-on-write so that the resulting tensor is
+        # writable without ever modifying the file.
+        x = np.load(path, mmap_mode="c")
+        x = torch.from_numpy(x)
+        if region is not None:
+            rows, cols = region
+            x = x[:, rows][:, :, cols]
+        if self.dtype == "uint8":
+            x = x.to(torch.float) / 255.0
+        return x
+
+    def get_shape(self, key):
+        path = self.get_path(key)
+        if not exists(path):
+            return None
+        # only the header of the file is read
+        x = np.load(path, mmap_mode="r")
+        return torch.Size(x.shape)
+
+    def put(self, key, x):
+        x = x.detach().to("cpu")
+        if self.dtype == "uint8":
+            x = (255.0 * x).round().clamp(0, 255).to(torch.uint8)
+        else:
+            x = x.to(torch.float32)
+        x = x.numpy()
+
+        # The entry is written to a temporary file first and then renamed so
+        # that concurrent readers never see a partially written file.
+        path = self.get_path(key)
+        tmp_path = f"{path}.{getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, x)
+        replace(tmp_path, path)
@@ -1,5 +1,6 @@
 import torch
 from torch.utils.data import Dataset
+from PIL import Image
 from torchvision.datasets.utils import download_and_extract_archive
 from torchvision.io import read_image as base_read_image
 
@@ -51,6 +52,12 @@ class FMD(Dataset):
         x = read_image(gt_path)
         return x
 
+    # NOTE: Only the header of the file is read.
+    def get_size(self, index):
+        with Image.open(self.gt_paths[index]) as image:
+            w, h = image.size
+        return h, w
+
     def __len__(self):
         return self.split_size
 
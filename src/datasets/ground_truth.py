@@ -1,12 +1,24 @@
 from torch.utils.data import Dataset
 from torchvision.transforms import InterpolationMode, functional as TF
-from functools import wraps
 
 from .div2k import Div2K
 from .tomography import TomographyDataset
 from .urban100 import Urban100
 from .fmd import FMD
 from .single_image import SingleImageDataset
+from .disk_cache import DiskCache
+from .memoization import get_memoization_cache
+from .shards import ShardedDataset
+
+
+# NOTE: This is the size of the images resized by TF.resize when the size of
+# their smallest edge is given.
+def get_resized_size(size, target):
+    h, w = size
+    if w <= h:
+        return int(target * h / w), target
+    else:
+        return target, int(target * w / h)
 
 
 class GroundTruthDataset(Dataset):
@@ -19,6 +31,11 @@ class GroundTruthDataset(Dataset):
         download,
         size,
         memoize_gt,
+        memoize_backend,
+        memoize_max_bytes,
+        disk_cache,
+        disk_cache_dtype,
+        sharded,
     ):
         super().__init__()
         self.size = size
@@ -26,12 +43,22 @@ class GroundTruthDataset(Dataset):
 
         dataset_name = dataset_name.lower()
 
-        if dataset_name == "div2k":
+        # NOTE: The shards are written by demo/pack_dataset.py.
+        if sharded:
+            self.dataset = ShardedDataset(
+                root=f"{datasets_dir}/shards/{dataset_name}/{split}"
+            )
+        elif dataset_name == "div2k":
             self.dataset = Div2K(split, datasets_dir, download=download)
         elif dataset_name == "urban100":
             self.dataset = Urban100(split, datasets_dir, download=download)
         elif dataset_name == "ct":
-            self.dataset = TomographyDataset(split, datasets_dir, download=download)
+            self.dataset = TomographyDataset(
+                split,
+                datasets_dir,
+                download=download,
+                **blueprint.get(TomographyDataset.__name__, {}),
+            )
         elif dataset_name == "fmd":
             self.dataset = FMD(split, datasets_dir, download=download)
         elif dataset_name == "single_image":
@@ -39,6 +66,28 @@ class GroundTruthDataset(Dataset):
         else:
             raise ValueError(f"Unknown dataset: {dataset_name}")
 
+        size_name = "full" if size is None else size
+
+        # NOTE: The single image dataset is left out of the caches as its
+        # entries are not identified by its name and the image is already
+        # kept in memory.
+        if disk_cache and dataset_name != "single_image":
+            self.disk_cache = DiskCache(
+                root=f"{datasets_dir}/cache/{dataset_name}/{split}/{size_name}_{disk_cache_dtype}",
+                dtype=disk_cache_dtype,
+            )
+        else:
+            self.disk_cache = None
+
+        if memoize_gt and dataset_name != "single_image":
+            self.memoization_cache = get_memoization_cache(
+                backend=memoize_backend,
+                name=f"memoized_gt_{dataset_name}_{split}_{size_name}",
+                max_bytes=memoize_max_bytes,
+            )
+        else:
+            self.memoization_cache = None
+
     def get_unique_id(self, index):
         if hasattr(self.dataset, "get_unique_id"):
             id = self.dataset.get_unique_id(index)
@@ -46,31 +95,46 @@ class GroundTruthDataset(Dataset):
             id = index
         return id
 
-    @staticmethod
-    def memoize_load_image(f):
-        cache = {}
-
-        @wraps(f)
-        def wrapper(*args, **kwargs):
-            self = args[0]
-            if not self.memoize_gt:
-                x = f(*args, **kwargs)
-            else:
-                key = (args, frozenset(kwargs.items()))
-                if key not in cache:
-                    x = f(*args, **kwargs)
-                    device = x.device
-                    # NOTE: This should be unnecessary.
-                    x = x.to("cpu")
-                    cache[key] = (device, x)
-                device, x = cache[key]
-                x = x.to(device)
-            return x
-
-        return wrapper
-
-    @memoize_load_image
     def __getitem__(self, index):
+        if self.memoization_cache is None:
+            return self.load_image(index)
+
+        x = self.memoization_cache.get(index)
+        if x is None:
+            x = self.load_image(index)
+            self.memoization_cache.put(index, x)
+        return x
+
+    # NOTE: The images which are not memoized are read together if the
+    # dataset supports it, e.g. consecutive slices of the CT volume.
+    def get_batch(self, indices):
+        xs = [None] * len(indices)
+        if self.memoization_cache is not None:
+            for k, index in enumerate(indices):
+                xs[k] = self.memoization_cache.get(index)
+
+        missing = [index for index, x in zip(indices, xs) if x is None]
+        if missing and hasattr(self.dataset, "prefetch"):
+            self.dataset.prefetch(missing)
+
+        for k, index in enumerate(indices):
+            if xs[k] is None:
+                xs[k] = self.load_image(index)
+                if self.memoization_cache is not None:
+                    self.memoization_cache.put(index, xs[k])
+
+        # NOTE: The prefetched images are unused if they were cached on disk.
+        if hasattr(self.dataset, "prefetch"):
+            for index in missing:
+                self.dataset.prefetched.pop(index, None)
+        return xs
+
+    def load_image(self, index):
+        if self.disk_cache is not None:
+            x = self.disk_cache.get(index)
+            if x is not None:
+                return x
+
         x = self.dataset[index]
         if self.size is not None:
             x = TF.resize(
@@ -80,7 +144,47 @@ class GroundTruthDataset(Dataset):
                 antialias=True,
             )
 
+        # NOTE: The entry is read back so that the result is the same whether
+        # it was in the cache or not, e.g. after quantization.
+        if self.disk_cache is not None:
+            self.disk_cache.put(index, x)
+            x = self.disk_cache.get(index)
+
         return x
 
+    # NOTE: When the images are cached on disk, only the rows of the region
+    # are read instead of the whole image. Otherwise, the whole image is
+    # loaded as PNG files can't be decoded partially.
+    def get_region(self, index, rows, cols):
+        if self.disk_cache is not None:
+            x = self.disk_cache.get(index, region=(rows, cols))
+            if x is not None:
+                return x
+
+        x = self[index]
+        return x[:, rows][:, :, cols]
+
+    # NOTE: The size of the image is read from the disk cache or from the
+    # metadata of the dataset, e.g. from the header of a PNG file, rather than
+    # from the image itself whenever possible.
+    def get_size(self, index):
+        if self.disk_cache is not None:
+            shape = self.disk_cache.get_shape(index)
+            if shape is not None:
+                return tuple(shape[-2:])
+
+        if hasattr(self.dataset, "get_size"):
+            size = self.dataset.get_size(index)
+            if self.size is not None:
+                size = get_resized_size(size, self.size)
+            return size
+
+        return tuple(self[index].shape[-2:])
+
+    def get_memoization_stats(self):
+        if self.memoization_cache is None:
+            return None
+        return self.memoization_cache.get_stats()
+
     def __len__(self):
         return len(self.dataset)
@@ -0,0 +1,44 @@
+import json
+from hashlib import sha256
+from os import getpid, replace
+from os.path import exists
+
+from .disk_cache import DiskCache
+
+
+def get_digest(config):
+    config = json.dumps(config, sort_keys=True)
+    return sha256(config.encode()).hexdigest()
+
+
+class MeasurementStore:
+    # NOTE: The store is meant for deterministic measurements only, i.e. when
+    # the measurements are a function of the ground truth images, the physics
+    # and the index of the images. The configuration must account for all of
+    # these.
+    def __init__(self, root, config):
+        self.root = f"{root}/{get_digest(config)}"
+        self.ground_truth_cache = DiskCache(root=f"{self.root}/x")
+        self.measurement_cache = DiskCache(root=f"{self.root}/y")
+
+        # The configuration is written once, to a temporary file first, so
+        # that concurrent processes never see a partially written file.
+        path = f"{self.root}/config.json"
+        if not exists(path):
+            tmp_path = f"{path}.{getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(config, f, indent=4, sort_keys=True)
+            replace(tmp_path, path)
+
+    def get(self, index):
+        # NOTE: The measurement is written last so its presence implies the
+        # presence of the ground truth image.
+        y = self.measurement_cache.get(index)
+        if y is None:
+            return None
+        x = self.ground_truth_cache.get(index)
+        return x, y
+
+    def put(self, index, x, y):
+        self.ground_truth_cache.put(index, x)
+        self.measurement_cache.put(index, y)
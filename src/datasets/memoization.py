@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from atexit import register
+from multiprocessing import Value
+from os import getpid, remove, scandir, utime
+from os.path import isdir
+from shutil import rmtree
+from tempfile import gettempdir
+
+from .disk_cache import DiskCache
+
+
+def get_nbytes(x):
+    return x.element_size() * x.nelement()
+
+
+class MemoryCache:
+    # NOTE: Entries are kept as is, on the device they were computed on, and
+    # each process (e.g. each DataLoader worker) has its own copy of the cache.
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        x = self.entries.get(key)
+        if x is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return x
+
+    def put(self, key, x):
+        nbytes = get_nbytes(x)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+
+        if key in self.entries:
+            self.nbytes -= get_nbytes(self.entries.pop(key))
+        self.entries[key] = x
+        self.nbytes += nbytes
+
+        # evict the least recently used entries
+        while self.max_bytes is not None and self.nbytes > self.max_bytes:
+            _, y = self.entries.popitem(last=False)
+            self.nbytes -= get_nbytes(y)
+
+    def get_stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+        }
+
+
+class SharedMemoryCache:
+    # NOTE: Entries are memory-mapped files in a shared memory filesystem so
+    # that the main process and all the DataLoader workers see a single copy
+    # of each entry. The modification time of the files is used to keep track
+    # of the least recently used entries.
+    def __init__(self, name, max_bytes=None):
+        shm_dir = "/dev/shm" if isdir("/dev/shm") else gettempdir()
+        self.root = f"{shm_dir}/{name}_{getpid()}"
+        self.disk_cache = DiskCache(root=self.root)
+        self.max_bytes = max_bytes
+        self.hits = Value("q", 0)
+        self.misses = Value("q", 0)
+
+        # NOTE: The entries are only removed by the process which created the
+        # cache as the DataLoader workers exit without running the handlers.
+        register(rmtree, self.root, ignore_errors=True)
+
+    def get(self, key):
+        x = self.disk_cache.get(key)
+        if x is None:
+            counter = self.misses
+        else:
+            counter = self.hits
+            try:
+                utime(self.disk_cache.get_path(key))
+            except FileNotFoundError:
+                pass
+        with counter.get_lock():
+            counter.value += 1
+        return x
+
+    def put(self, key, x):
+        self.disk_cache.put(key, x)
+        if self.max_bytes is not None:
+            self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in scandir(self.root):
+            if not entry.name.endswith(".npy"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        entries.sort()
+
+        nbytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if nbytes <= self.max_bytes:
+                break
+            # NOTE: Mapped entries remain valid after their removal.
+            try:
+                remove(path)
+            except FileNotFoundError:
+                pass
+            nbytes -= size
+
+    def get_stats(self):
+        entries = [
+            entry for entry in scandir(self.root) if entry.name.endswith(".npy")
+        ]
+        return {
+            "hits": self.hits.value,
+            "misses": self.misses.value,
+            "entries": len(entries),
+            "bytes": sum(entry.stat().st_size for entry in entries),
+        }
+
+
+def get_memoization_cache(backend, name, max_bytes):
+    if backend == "memory":
+        cache = MemoryCache(max_bytes=max_bytes)
+    elif backend == "shared":
+        cache = SharedMemoryCache(name=name, max_bytes=max_bytes)
+    else:
+        raise ValueError(f"Unknown memoization backend: {backend}")
+    return cache
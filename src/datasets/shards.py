@@ -0,0 +1,210 @@
+import json
+import random
+import tarfile
+from io import BytesIO
+from os import getpid, makedirs
+from warnings import warn
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+
+
+def encode_image(x, dtype):
+    x = x.detach().to("cpu")
+    if dtype == "uint8":
+        x = (255.0 * x).round().clamp(0, 255).to(torch.uint8)
+    elif dtype == "float32":
+        x = x.to(torch.float32)
+    else:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+    f = BytesIO()
+    np.save(f, x.numpy())
+    return f.getvalue()
+
+
+def decode_image(data):
+    x = np.load(BytesIO(data))
+    x = torch.from_numpy(x)
+    if x.dtype == torch.uint8:
+        x = x.to(torch.float) / 255.0
+    return x
+
+
+def pack_shards(dataset, root, shard_size, dtype="uint8"):
+    """
+    Write the images of a dataset to large tar files, or shards, along with an
+    index making it possible to read them without listing any directory
+
+    :param dataset: dataset of images, e.g. Div2K
+    :param root: directory where to write the shards and the index
+    :param shard_size: approximate size of the shards in bytes
+    :param dtype: dtype of the images in the shards, i.e. uint8 or float32
+    """
+    makedirs(root, exist_ok=True)
+
+    entries = []
+    shards = []
+    tar = None
+    for index in range(len(dataset)):
+        data = encode_image(dataset[index], dtype=dtype)
+
+        if tar is None or tar.offset + len(data) > shard_size:
+            if tar is not None:
+                tar.close()
+            shards.append(f"shard_{len(shards):05d}.tar")
+            tar = tarfile.open(f"{root}/{shards[-1]}", "w")
+
+        member = tarfile.TarInfo(name=f"{index:06d}.npy")
+        member.size = len(data)
+        tar.addfile(member, BytesIO(data))
+
+        if hasattr(dataset, "get_unique_id"):
+            unique_id = dataset.get_unique_id(index)
+        else:
+            unique_id = index
+        entries.append(
+            {"shard": shards[-1], "name": member.name, "unique_id": unique_id}
+        )
+    if tar is not None:
+        tar.close()
+
+    # NOTE: The offsets are read back as the size of the headers written by
+    # tarfile varies.
+    offsets = {}
+    for shard in shards:
+        with tarfile.open(f"{root}/{shard}", "r") as tar:
+            for member in tar.getmembers():
+                offsets[shard, member.name] = member.offset_data, member.size
+    for entry in entries:
+        entry["offset"], entry["size"] = offsets[entry["shard"], entry["name"]]
+
+    with open(f"{root}/index.json", "w") as f:
+        json.dump({"shards": shards, "entries": entries}, f)
+
+
+class ShardedDataset(Dataset):
+    # NOTE: The entries are read using the offsets in the index so that no
+    # directory is ever listed and so that each shard is only opened once per
+    # process.
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+        with open(f"{self.root}/index.json") as f:
+            index = json.load(f)
+        self.shards = index["shards"]
+        self.entries = index["entries"]
+        self.files = {}
+        self.files_pid = None
+        # images read ahead of time by ShardStream
+        self.prefetched = {}
+
+    def __getitem__(self, index):
+        x = self.prefetched.pop(index, None)
+        if x is None:
+            entry = self.entries[index]
+            f = self.get_file(entry["shard"])
+            f.seek(entry["offset"])
+            x = decode_image(f.read(entry["size"]))
+        return x
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_unique_id(self, index):
+        return self.entries[index]["unique_id"]
+
+    # NOTE: File objects are not shared with forked processes, e.g.
+    # DataLoader workers, as their positions would be.
+    def get_file(self, shard):
+        if self.files_pid != getpid():
+            self.files = {}
+            self.files_pid = getpid()
+        if shard not in self.files:
+            self.files[shard] = open(f"{self.root}/{shard}", "rb")
+        return self.files[shard]
+
+    def read_shard(self, shard):
+        indices = [
+            index
+            for index, entry in enumerate(self.entries)
+            if entry["shard"] == shard
+        ]
+        indices.sort(key=lambda index: self.entries[index]["offset"])
+        with open(f"{self.root}/{shard}", "rb") as f:
+            for index in indices:
+                entry = self.entries[index]
+                f.seek(entry["offset"])
+                yield index, decode_image(f.read(entry["size"]))
+
+
+class ShardStream(IterableDataset):
+    """
+    Stream the entries of a dataset whose ground truth images are stored in
+    shards, reading each shard sequentially
+
+    The shards are shuffled and split between the DataLoader workers at every
+    epoch, and the entries are shuffled using a buffer.
+
+    :param dataset: map-style dataset built on top of the sharded dataset
+    :param ShardedDataset sharded_dataset: dataset of ground truth images
+    :param int shuffle_buffer_size: number of entries in the shuffle buffer
+    :param int seed: seed used for shuffling without DataLoader workers
+    """
+
+    def __init__(self, dataset, sharded_dataset, shuffle_buffer_size, seed=0):
+        super().__init__()
+        self.dataset = dataset
+        self.sharded_dataset = sharded_dataset
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.seed = seed
+        self.epoch = 0
+
+    def __iter__(self):
+        # NOTE: All the workers must shuffle the shards the same way. The base
+        # seed drawn by DataLoader is shared by the workers, and they all go
+        # through the same epochs if they are persistent.
+        worker_info = get_worker_info()
+        if worker_info is not None:
+            worker_id = worker_info.id
+            num_workers = worker_info.num_workers
+            seed = worker_info.seed - worker_info.id
+        else:
+            worker_id = 0
+            num_workers = 1
+            seed = self.seed
+        rng = random.Random(seed + self.epoch)
+        self.epoch += 1
+
+        shards = list(self.sharded_dataset.shards)
+        # NOTE: The shards are split between the workers and not their
+        # entries, so the workers without any shard stay idle.
+        if worker_id == 0 and num_workers > len(shards):
+            warn(
+                f"{num_workers - len(shards)} of the {num_workers} DataLoader workers are idle as there are only {len(shards)} shards"
+            )
+        rng.shuffle(shards)
+        shards = shards[worker_id::num_workers]
+
+        buffer = []
+        for shard in shards:
+            for index, x in self.sharded_dataset.read_shard(shard):
+                self.sharded_dataset.prefetched[index] = x
+                buffer.append(index)
+                if len(buffer) >= self.shuffle_buffer_size:
+                    k = rng.randrange(len(buffer))
+                    buffer[k], buffer[-1] = buffer[-1], buffer[k]
+                    yield self.get_entry(buffer.pop())
+
+        rng.shuffle(buffer)
+        for index in buffer:
+            yield self.get_entry(index)
+
+    def get_entry(self, index):
+        entry = self.dataset[index]
+        # NOTE: The prefetched image is unused if it was cached elsewhere.
+        self.sharded_dataset.prefetched.pop(index, None)
+        return entry
+
+    def __len__(self):
+        return len(self.dataset)
@@ -1,6 +1,10 @@
+import torch
 from torch.utils.data import Dataset
 
+from crop import CropPair
 from .ground_truth import GroundTruthDataset
+from .measurement_store import MeasurementStore
+from .single_image import SingleImageDataset
 
 
 class SyntheticDataset(Dataset):
@@ -10,12 +14,15 @@ class SyntheticDataset(Dataset):
         device,
         deterministic_measurements,
         unique_seeds,
+        batched_degradation,
+        precomputed_measurements,
         physics,
     ):
         super().__init__()
         self.device = device
         self.deterministic_measurements = deterministic_measurements
         self.unique_seeds = unique_seeds
+        self.batched_degradation = batched_degradation
         self.physics_manager = getattr(physics, "__manager")
 
         self.ground_truth_dataset = GroundTruthDataset(
@@ -23,10 +30,199 @@ class SyntheticDataset(Dataset):
             **blueprint[GroundTruthDataset.__name__],
         )
 
+        if precomputed_measurements:
+            assert deterministic_measurements and unique_seeds, "Precomputed measurements must be deterministic"
+            ground_truth_blueprint = blueprint[GroundTruthDataset.__name__]
+            # NOTE: The noise depends on the kind of device it is sampled on.
+            config = {
+                "physics": self.physics_manager.get_config(),
+                "device": torch.device(device).type,
+                "dataset_name": ground_truth_blueprint["dataset_name"].lower(),
+                "split": ground_truth_blueprint["split"],
+                "size": ground_truth_blueprint["size"],
+            }
+            if ground_truth_blueprint["disk_cache"]:
+                config["disk_cache_dtype"] = ground_truth_blueprint["disk_cache_dtype"]
+            if config["dataset_name"] == "single_image":
+                config["single_image"] = blueprint["SingleImageDataset"]
+            self.measurement_store = MeasurementStore(
+                root=f"{ground_truth_blueprint['datasets_dir']}/cache/measurements",
+                config=config,
+            )
+        else:
+            self.measurement_store = None
+
+        # the single image on the device and its noiseless measurement
+        self.single_image = None
+        # the measurement of the single image if it is the same for all the
+        # duplicates
+        self.single_image_measurement = None
+
     def __getitem__(self, index):
+        if self.is_single_image():
+            x, y = self.get_single_image_batch([index])
+            return self.postprocess(x, y[0])
+
+        if self.measurement_store is not None:
+            pair = self.measurement_store.get(index)
+            if pair is not None:
+                x, y = pair
+                x, y = x.to(self.device), y.to(self.device)
+                return self.postprocess(x, y)
+
         x = self.ground_truth_dataset[index]
         x = x.to(self.device)
+        seed = self.get_seed(index)
+
+        x = x.unsqueeze(0)
+        y = self.physics_manager.randomly_degrade(x, seed=seed)
+        y = y.squeeze(0)
+        x = x.squeeze(0)
+
+        if self.measurement_store is not None:
+            self.measurement_store.put(index, x, y)
+
+        return self.postprocess(x, y)
+
+    def get_batch(self, indices):
+        if self.is_single_image():
+            x, y = self.get_single_image_batch(indices)
+            return [self.postprocess(x, y_i) for y_i in y]
+
+        if not self.batched_degradation:
+            return [self[index] for index in indices]
+
+        pairs = [None] * len(indices)
+        if self.measurement_store is not None:
+            for i, index in enumerate(indices):
+                pair = self.measurement_store.get(index)
+                if pair is not None:
+                    x, y = pair
+                    pairs[i] = x.to(self.device), y.to(self.device)
+
+        # NOTE: Ground truth images can have different sizes, in which case
+        # they are degraded in groups of images of the same size.
+        missing = [i for i, pair in enumerate(pairs) if pair is None]
+        xs = self.ground_truth_dataset.get_batch([indices[i] for i in missing])
+        xs = {i: x.to(self.device) for i, x in zip(missing, xs)}
+        groups = {}
+        for i in missing:
+            groups.setdefault(xs[i].shape, []).append(i)
+
+        for group in groups.values():
+            x = torch.stack([xs[i] for i in group])
+            seeds = [self.get_seed(indices[i]) for i in group]
+            y = self.physics_manager.degrade_batch(x, seeds=seeds)
+            for i, y_i in zip(group, y):
+                pairs[i] = xs[i], y_i
+                if self.measurement_store is not None:
+                    self.measurement_store.put(indices[i], xs[i], y_i)
+
+        return [self.postprocess(x, y) for x, y in pairs]
+
+    # NOTE: This is equivalent to cropping the pair returned by __getitem__
+    # but only the part of the ground truth image needed for the crop is
+    # degraded.
+    def get_patch(self, index, size, location, xy_size_ratio):
+        T_crop = CropPair(location=location, size=size)
+        patch_margin = self.physics_manager.get_patch_margin()
+        from os import environ
+        if (
+            patch_margin is None
+            or self.measurement_store is not None
+            or "HOMOGENEOUS_SWINIR" in environ
+        ):
+            x, y = self[index]
+            return T_crop(x, y, xy_size_ratio=xy_size_ratio)
+
+        # NOTE: Only the window needed for the crop is read (if possible) and
+        # moved to the device, and the size of the image is read from its
+        # metadata. The cost of drawing the noise only depends on the size of
+        # the crop if the seeded noise is drawn by tiles (see add_noise).
+        shape = self.ground_truth_dataset.get_size(index)
+
+        r = xy_size_ratio
+        h, w = shape[-2] // r, shape[-1] // r
+        # NOTE: Images smaller than the crops are padded by CropPair.
+        if h < size or w < size:
+            x, y = self[index]
+            return T_crop(x, y, xy_size_ratio=xy_size_ratio)
 
+        margin, circular = patch_margin
+        # NOTE: Circular boundary conditions apply to the whole image which
+        # must then be made of whole blocks of r x r pixels.
+        if circular and (shape[-2] != h * r or shape[-1] != w * r):
+            x, y = self[index]
+            return T_crop(x, y, xy_size_ratio=xy_size_ratio)
+
+        i, j = T_crop.sample_location(h, w)
+        if circular:
+            rows = torch.arange((i - margin) * r, (i + size + margin) * r) % shape[-2]
+            cols = torch.arange((j - margin) * r, (j + size + margin) * r) % shape[-1]
+            top, left = margin, margin
+        else:
+            # NOTE: The window is clipped to the image so that the boundary
+            # conditions of the operator apply at the borders of the image.
+            window_top = max(0, i - margin)
+            window_left = max(0, j - margin)
+            window_bottom = min(h, i + size + margin)
+            window_right = min(w, j + size + margin)
+            bottom = shape[-2] if window_bottom == h else window_bottom * r
+            right = shape[-1] if window_right == w else window_right * r
+            rows = slice(window_top * r, bottom)
+            cols = slice(window_left * r, right)
+            top, left = i - window_top, j - window_left
+
+        x_window = self.ground_truth_dataset.get_region(index, rows=rows, cols=cols)
+        x_window = x_window.to(self.device)
+
+        y = self.physics_manager.physics.A(x_window.unsqueeze(0))
+        y = y[:, :, top : top + size, left : left + size]
+        y = self.physics_manager.add_noise(
+            y,
+            seed=self.get_seed(index),
+            shape=(1, y.shape[1], h, w),
+            location=(i, j),
+        )
+        y = y.squeeze(0)
+
+        x = x_window[
+            :, top * r : (top + size) * r, left * r : (left + size) * r
+        ]
+        return x, y
+
+    def is_single_image(self):
+        return (
+            isinstance(self.ground_truth_dataset.dataset, SingleImageDataset)
+            and self.measurement_store is None
+            and self.physics_manager.kernel_sampler is None
+        )
+
+    # NOTE: The duplicates of the single image share the same ground truth
+    # tensor, which is moved to the device only once, and the operator is
+    # only applied to it once. Only the noise is drawn for every duplicate,
+    # unless it is the same for all of them. The measurements are the same as
+    # the ones returned by randomly_degrade.
+    def get_single_image_batch(self, indices):
+        if self.single_image is None:
+            x = self.ground_truth_dataset[0].to(self.device)
+            y = self.physics_manager.physics.A(x.unsqueeze(0))
+            self.single_image = x, y
+        x, y = self.single_image
+
+        if self.deterministic_measurements and not self.unique_seeds:
+            if self.single_image_measurement is None:
+                self.single_image_measurement = self.physics_manager.add_noise(
+                    y, seed=self.get_seed(0)
+                )
+            y = self.single_image_measurement.expand(len(indices), -1, -1, -1)
+        else:
+            seeds = [self.get_seed(index) for index in indices]
+            y = y.expand(len(indices), -1, -1, -1)
+            y = self.physics_manager.add_noise_batch(y, seeds=seeds)
+        return x, y
+
+    def get_seed(self, index):
         if self.deterministic_measurements:
             if self.unique_seeds:
                 seed = self.ground_truth_dataset.get_unique_id(index)
@@ -34,12 +230,9 @@ class SyntheticDataset(Dataset):
                 seed = 0
         else:
             seed = None
+        return seed
 
-        x = x.unsqueeze(0)
-        y = self.physics_manager.randomly_degrade(x, seed=seed)
-        y = y.squeeze(0)
-        x = x.squeeze(0)
-
+    def postprocess(self, x, y):
         from os import environ
         if "HOMOGENEOUS_SWINIR" in environ:
             if self.physics_manager.task == "sr":
@@ -56,3 +249,6 @@ class SyntheticDataset(Dataset):
 
     def __len__(self):
         return len(self.ground_truth_dataset)
+
+    def get_memoization_stats(self):
+        return self.ground_truth_dataset.get_memoization_stats()
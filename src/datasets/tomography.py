@@ -1,33 +1,77 @@
-from deepinv.datasets import HDF5Dataset
+import h5py
+import torch
+from functools import partial
+from lru_cache import LRUCache
+from os import getpid
 from torch.utils.data import Dataset
 from torchvision.datasets.utils import download_and_extract_archive
 
 
 class TomographyDataset(Dataset):
-    def __init__(self, split, datasets_dir, channels=3, download=False):
+    # NOTE: The slices are read in slabs of consecutive slices, and the most
+    # recently used slabs are kept in memory if slab_cache_size is positive.
+    def __init__(
+        self,
+        split,
+        datasets_dir,
+        channels=3,
+        download=False,
+        slab_size=16,
+        slab_cache_size=0,
+    ):
         super().__init__()
         assert split in ["train", "val"]
         self.split = split
         self.datasets_dir = datasets_dir
         assert channels in [1, 3], "Channels must be 1 or 3"
         self.channels = channels
-
-        self._dataset = HDF5Dataset(
-            f"{self.datasets_dir}/CT/dinv_dataset0.h5", train=(self.split == "train")
-        )
+        self.slab_size = slab_size
+        self.slab_cache_size = slab_cache_size
 
         if download:
             self.download(datasets_dir)
 
+        self.path = f"{self.datasets_dir}/CT/dinv_dataset0.h5"
+        # NOTE: The file is opened lazily by each process as h5py file handles
+        # can't be shared with forked processes, e.g. DataLoader workers.
+        self.file = None
+        self.file_pid = None
+        self.slab_cache = LRUCache(slab_cache_size)
+        # slices read ahead of time by prefetch
+        self.prefetched = {}
+
+        # same datasets as for deepinv.datasets.HDF5Dataset
+        with h5py.File(self.path, "r") as f:
+            if self.split == "train":
+                self.key = "x_train" if "x_train" in f else "y_train"
+            else:
+                self.key = "x_test"
+            self.size = len(f[self.key])
+
+    def get_data(self):
+        if self.file_pid != getpid():
+            self.file = h5py.File(self.path, "r")
+            self.file_pid = getpid()
+            self.slab_cache.clear()
+        return self.file[self.key]
+
     def __getitem__(self, index):
-        x, _ = self._dataset[index]
+        x = self.prefetched.pop(index, None)
+        if x is None:
+            if self.slab_cache_size > 0:
+                slab = self.get_slab(index // self.slab_size)
+                x = slab[index % self.slab_size]
+            else:
+                x = self.read_slices(index, index + 1)[0]
+
+        # NOTE: The channels are views of the same memory.
         if self.channels == 3:
-            x = x.repeat(3, 1, 1)
-        assert x.shape[0] == 3
+            x = x.expand(3, -1, -1)
+        assert x.shape[0] == self.channels
         return x
 
     def __len__(self):
-        size = len(self._dataset)
+        size = self.size
         if self.split == "train":
             assert size == 4992
         elif self.split == "val":
@@ -41,6 +85,30 @@ class TomographyDataset(Dataset):
             id = index + 4992
         return id
 
+    # NOTE: Runs of consecutive indices are read in a single hyperslab.
+    def prefetch(self, indices):
+        indices = sorted(set(indices))
+        start = 0
+        for k in range(1, len(indices) + 1):
+            if k == len(indices) or indices[k] != indices[k - 1] + 1:
+                slices = self.read_slices(indices[start], indices[k - 1] + 1)
+                for index, x in zip(indices[start:k], slices):
+                    self.prefetched[index] = x
+                start = k
+
+    def read_slices(self, start, stop):
+        x = self.get_data()[start:stop]
+        x = torch.from_numpy(x).to(torch.float)
+        return x
+
+    def get_slab(self, slab_index):
+        return self.slab_cache.get(slab_index, partial(self.read_slab, slab_index))
+
+    def read_slab(self, slab_index):
+        start = slab_index * self.slab_size
+        stop = min(start + self.slab_size, self.size)
+        return self.read_slices(start, stop)
+
     @staticmethod
     def download(datasets_dir):
         download_and_extract_archive(
@@ -1,5 +1,6 @@
 import torch
 from torch.utils.data import Dataset
+from PIL import Image
 from torchvision.datasets.utils import download_and_extract_archive
 from torchvision.io import read_image
 
@@ -25,12 +26,21 @@ class Urban100(Dataset):
             self.download(datasets_dir)
 
     def __getitem__(self, index):
-        index = self.split_offset + index
-        file_path = f"{self.datasets_dir}/Urban100/Urban100_HR/img_{index:03d}.png"
+        file_path = self.get_file_path(index)
         x = read_image(file_path)
         x = x.to(torch.float) / 255.0
         return x
 
+    # NOTE: Only the header of the file is read.
+    def get_size(self, index):
+        with Image.open(self.get_file_path(index)) as image:
+            w, h = image.size
+        return h, w
+
+    def get_file_path(self, index):
+        index = self.split_offset + index
+        return f"{self.datasets_dir}/Urban100/Urban100_HR/img_{index:03d}.png"
+
     def __len__(self):
         return self.split_size
 
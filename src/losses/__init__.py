@@ -1,3 +1,4 @@
+import torch
 from torch.nn import Module
 from deepinv.loss import SupLoss, EILoss
 from deepinv.loss.metric import mse
@@ -6,8 +7,9 @@ from torch.nn.functional import l1_loss
 
 from crop import CropPair
 from transforms import ScalingTransform, CombinedTransform
+from .batching import CallScheduler
 from .r2r import R2REILoss
-from .sure import SureGaussianLoss
+from .sure import SureGaussianLoss, probe_div, sample_probe
 
 
 class SupervisedLoss(Module):
@@ -49,7 +51,16 @@ class Noise2InverseLoss(Module):
 
 
 class SURELoss(Module):
-    def __init__(self, noise_level, cropped_div, averaged_cst, margin, physics):
+    def __init__(
+        self,
+        noise_level,
+        cropped_div,
+        averaged_cst,
+        margin,
+        probes,
+        batched_probes,
+        physics,
+    ):
         super().__init__()
         self.physics = physics
         self.loss = SureGaussianLoss(
@@ -57,11 +68,18 @@ class SURELoss(Module):
             cropped_div=cropped_div,
             averaged_cst=averaged_cst,
             margin=margin,
+            probes=probes,
+            batched_probes=batched_probes,
         )
 
     def forward(self, x, y, model):
-        x_net = model(y)
-        return self.loss(x=x, x_net=x_net, y=y, physics=self.physics, model=model)
+        if self.loss.batched_probes:
+            x_net, probes = self.loss.batched_forward(y, model)
+        else:
+            x_net, probes = model(y), None
+        return self.loss(
+            x=x, x_net=x_net, y=y, physics=self.physics, model=model, probes=probes
+        )
 
 
 class ProposedLoss(Module):
@@ -74,8 +92,12 @@ class ProposedLoss(Module):
         sure_cropped_div,
         sure_averaged_cst,
         sure_margin,
+        sure_probes,
+        sure_batched_probes,
         alpha_tradeoff,
         transforms,
+        fuse_model_calls,
+        time_model_calls,
         physics,
     ):
         super().__init__()
@@ -103,6 +125,8 @@ class ProposedLoss(Module):
                     sigma=noise_level / 255,
                     no_grad=stop_gradient,
                     metric=mse(),
+                    fuse_calls=fuse_model_calls,
+                    time_calls=time_model_calls,
                 )
             ]
         else:
@@ -111,6 +135,8 @@ class ProposedLoss(Module):
                 cropped_div=sure_cropped_div,
                 averaged_cst=sure_averaged_cst,
                 margin=sure_margin,
+                probes=sure_probes,
+                batched_probes=sure_batched_probes,
             )
             loss_fns = [sure_loss]
 
@@ -126,21 +152,96 @@ class ProposedLoss(Module):
 
         # NOTE: This could be done better.
         if sure_alternative == "r2r":
-            self.compute_x_net = False
+            self.sure_loss = None
+            self.equivariant_loss = None
         else:
-            self.compute_x_net = True
+            self.sure_loss = sure_loss
+            self.equivariant_loss = equivariant_loss
+        self.fuse_model_calls = fuse_model_calls
+        self.time_model_calls = time_model_calls
+        self.call_stats = {}
 
     def forward(self, x, y, model):
-        if self.compute_x_net:
-            x_net = model(y)
-        else:
-            x_net = None
+        if self.sure_loss is not None:
+            return self.fused_forward(y, model)
 
         loss = 0
         for loss_fn in self.loss_fns:
-            loss += loss_fn(x=x, x_net=x_net, y=y, physics=self.physics, model=model)
+            loss += loss_fn(x=x, x_net=None, y=y, physics=self.physics, model=model)
+        return loss
+
+    # NOTE: The calls to the model and to the operator are planned for SURE
+    # and EI together. The reconstruction comes first as EI depends on it.
+    # The outputs for the SURE probes and for the EI input are then obtained
+    # at once, unless the probes are batched with the reconstruction, and the
+    # operator is applied to the reconstruction and to its transformed
+    # version at once. This is opt-in and all the calls are run one by one
+    # unless fuse_model_calls is set. The model draws its own random numbers
+    # once per (possibly fused) call and the SURE probes are all drawn before
+    # it is called on them, so stochastic models (e.g. with drop-path in
+    # training mode) only give the same results as when the losses are
+    # computed one after the other if the calls aren't fused and a single
+    # probe isn't batched.
+    def fused_forward(self, y, model):
+        sure_loss = self.sure_loss
+        equivariant_loss = self.equivariant_loss
+        physics = self.physics
+        fuse = self.fuse_model_calls
+        timed = self.time_model_calls
+        model_calls = CallScheduler(
+            model, stats=self.call_stats, fuse=fuse, timed=timed
+        )
+        physics_calls = CallScheduler(
+            physics.A, stats=self.call_stats, fuse=fuse, timed=timed
+        )
+
+        x_net_call = model_calls.submit(y, label="x_net")
+        margin = sure_loss.div_margin()
+        b = [sample_probe(y, margin=margin) for _ in range(sure_loss.probes)]
+        b = torch.stack(b)
+        if sure_loss.batched_probes:
+            probe_call = model_calls.submit(
+                (y + b * sure_loss.tau).flatten(0, 1), label="sure_probes"
+            )
+        x_net = x_net_call.result()
+        if not sure_loss.batched_probes:
+            probe_call = model_calls.submit(
+                (y + b * sure_loss.tau).flatten(0, 1), label="sure_probes"
+            )
+
+        if equivariant_loss.no_grad:
+            with torch.no_grad():
+                x2 = equivariant_loss.T(x_net)
+        else:
+            x2 = equivariant_loss.T(x_net)
+
+        y1_call = physics_calls.submit(x_net, label="A(x_net)")
+        y2_call = physics_calls.submit(x2, label="A(x_ei)")
+        y1 = y1_call.result()
+        y2 = y2_call.result()
+        if equivariant_loss.noise:
+            y2 = physics.sensor(physics.noise(y2))
+        x3 = model_calls.submit(y2, label="ei").result()
+
+        x_probes = probe_call.result()
+        y_probes = physics_calls.submit(x_probes, label="A(x_probes)").result()
+        y_probes = y_probes.unflatten(0, b.shape[:2])
+        div = probe_div(y1, y_probes, b, sure_loss.tau, margin=margin)
+
+        loss = sure_loss.combine(y, y1, div, physics)
+        loss += equivariant_loss.weight * equivariant_loss.metric(x3, x2)
         return loss
 
+    # NOTE: The statistics are keyed by the labels of the (fused) calls, e.g.
+    # sure_probes+ei, which gives the cost of every term.
+    def get_call_stats(self):
+        for loss_fn in self.loss_fns:
+            if hasattr(loss_fn, "get_call_stats"):
+                return loss_fn.get_call_stats()
+        if self.call_stats:
+            return self.call_stats
+        return None
+
 
 class Loss(Module):
     def __init__(
@@ -151,6 +252,8 @@ class Loss(Module):
         sure_cropped_div,
         sure_averaged_cst,
         sure_margin,
+        sure_probes,
+        sure_batched_probes,
         method,
         crop_training_pairs,
         crop_size,
@@ -170,6 +273,8 @@ class Loss(Module):
                 cropped_div=sure_cropped_div,
                 averaged_cst=sure_averaged_cst,
                 margin=sure_margin,
+                probes=sure_probes,
+                batched_probes=sure_batched_probes,
             )
         elif method == "proposed":
             self.loss = ProposedLoss(
@@ -179,6 +284,8 @@ class Loss(Module):
                 sure_cropped_div=sure_cropped_div,
                 sure_averaged_cst=sure_averaged_cst,
                 sure_margin=sure_margin,
+                sure_probes=sure_probes,
+                sure_batched_probes=sure_batched_probes,
                 **blueprint[ProposedLoss.__name__],
             )
         else:
@@ -206,6 +313,13 @@ class Loss(Module):
 
         return self.loss(x=x, y=y, model=model)
 
+    # NOTE: The statistics are the timings of the calls to the model, for the
+    # losses which record them.
+    def get_call_stats(self):
+        if hasattr(self.loss, "get_call_stats"):
+            return self.loss.get_call_stats()
+        return None
+
 
 def get_loss(args, physics):
     # NOTE: This is a bit of a mess.
@@ -240,6 +354,8 @@ def get_loss(args, physics):
         "sure_alternative": args.ProposedLoss__sure_alternative,
         "alpha_tradeoff": args.ProposedLoss__alpha_tradeoff,
         "transforms": args.ProposedLoss__transforms,
+        "fuse_model_calls": args.ProposedLoss__fuse_model_calls,
+        "time_model_calls": args.ProposedLoss__time_model_calls,
     }
 
     blueprint[ScalingTransform.__name__] = {
@@ -251,6 +367,8 @@ def get_loss(args, physics):
     noise_level = args.noise_level
     sure_cropped_div = args.sure_cropped_div
     sure_averaged_cst = args.sure_averaged_cst
+    sure_probes = args.sure_probes
+    sure_batched_probes = args.sure_batched_probes
 
     loss = Loss(
         physics=physics,
@@ -260,6 +378,8 @@ def get_loss(args, physics):
         sure_cropped_div=sure_cropped_div,
         sure_averaged_cst=sure_averaged_cst,
         sure_margin=sure_margin,
+        sure_probes=sure_probes,
+        sure_batched_probes=sure_batched_probes,
         **blueprint[Loss.__name__],
     )
 
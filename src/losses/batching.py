@@ -0,0 +1,93 @@
+import torch
+from time import perf_counter
+
+
+class PendingCall:
+    def __init__(self, scheduler, label):
+        self.scheduler = scheduler
+        self.label = label
+        self.output = None
+
+    def result(self):
+        if self.output is None:
+            self.scheduler.flush()
+        return self.output
+
+
+class CallScheduler:
+    r"""
+    Run the calls of a function as late as possible, fusing the ones which
+    are pending at once into a single call on their concatenated inputs.
+
+    A call is submitted with its input and it only runs when its result is
+    needed, along with all the other pending calls whose inputs have the same
+    size. Calls whose inputs depend on the results of other calls are
+    submitted after these results are obtained, and are therefore never
+    fused with them.
+
+    The number of (possibly fused) calls is accumulated in stats, keyed by
+    the labels of the calls joined with a "+", along with the time spent in
+    them if timed is set.
+
+    :param callable fn: function of a batch of inputs, e.g. a model.
+    :param dict stats: dictionary in which the statistics are accumulated.
+    :param bool fuse: fuse the pending calls, otherwise each call runs as soon as it is submitted.
+    :param bool timed: time the calls, which synchronizes the device around each of them.
+    """
+
+    def __init__(self, fn, stats, fuse=True, timed=False):
+        self.fn = fn
+        self.stats = stats
+        self.fuse = fuse
+        self.timed = timed
+        self.pending = []
+
+    def submit(self, x, label):
+        call = PendingCall(self, label)
+        self.pending.append((x, call))
+        if not self.fuse:
+            self.flush()
+        return call
+
+    # NOTE: Only the inputs of the same size can be concatenated, and the
+    # pending calls are grouped accordingly.
+    def flush(self):
+        groups = {}
+        for x, call in self.pending:
+            groups.setdefault(tuple(x.shape[1:]), []).append((x, call))
+        self.pending = []
+        for group in groups.values():
+            self.run(group)
+
+    def run(self, group):
+        inputs = [x for x, _ in group]
+        calls = [call for _, call in group]
+
+        # NOTE: The device is synchronized for the timings to be meaningful,
+        # which stalls the asynchronous execution of CUDA kernels, hence the
+        # calls are only timed on demand.
+        device = inputs[0].device
+        if self.timed:
+            if device.type == "cuda":
+                torch.cuda.synchronize(device)
+            start = perf_counter()
+
+        if len(inputs) == 1:
+            outputs = [self.fn(inputs[0])]
+        else:
+            outputs = self.fn(torch.cat(inputs))
+            outputs = outputs.split([x.shape[0] for x in inputs])
+
+        if self.timed:
+            if device.type == "cuda":
+                torch.cuda.synchronize(device)
+            elapsed = perf_counter() - start
+
+        for call, output in zip(calls, outputs):
+            call.output = output
+
+        key = "+".join(call.label for call in calls)
+        entry = self.stats.setdefault(key, {"calls": 0})
+        entry["calls"] += 1
+        if self.timed:
+            entry["seconds"] = entry.get("seconds", 0.0) + elapsed
@@ -3,6 +3,8 @@ import torch.nn as nn
 from torch.nn import Module
 from deepinv.loss.metric import mse
 
+from .batching import CallScheduler
+
 
 class R2RLoss(nn.Module):
     def __init__(self, metric=torch.nn.MSELoss(), eta=0.1, alpha=0.5):
@@ -13,18 +15,34 @@ class R2RLoss(nn.Module):
         self.alpha = alpha
 
     def forward(self, y, physics, model, **kwargs):
-        pert = torch.randn_like(y) * self.eta
-
-        y_plus = y + pert * self.alpha
-        y_minus = y - pert / self.alpha
+        y_plus, y_minus = self.perturb(y)
 
         output = model(y_plus, physics)
 
         return self.metric(physics.A(output), y_minus)
 
+    def perturb(self, y):
+        pert = torch.randn_like(y) * self.eta
+
+        y_plus = y + pert * self.alpha
+        y_minus = y - pert / self.alpha
+        return y_plus, y_minus
+
 
 class R2REILoss(Module):
-    def __init__(self, transform, sigma, no_grad=True, metric=None):
+    # NOTE: The model is called on the R2R input and on the first EI input at
+    # once as these calls are independent if fuse_calls is set. The
+    # forward passes of the model are counted per call, and timed if
+    # time_calls is set.
+    def __init__(
+        self,
+        transform,
+        sigma,
+        no_grad=True,
+        metric=None,
+        fuse_calls=False,
+        time_calls=False,
+    ):
         super().__init__()
         self.T = transform
         self.sigma = sigma
@@ -33,16 +51,32 @@ class R2REILoss(Module):
             metric = mse()
         self.metric = metric
         self.r2r_loss = R2RLoss(eta=self.sigma, alpha=0.5)
+        self.fuse_calls = fuse_calls
+        self.time_calls = time_calls
+        self.call_stats = {}
 
-    def forward(self, *kargs, **kwargs):
-        return self.r2r_loss(*kargs, **kwargs) + self.ei_loss(*kargs, **kwargs)
+    def forward(self, y, physics, model, **kwargs):
+        scheduler = CallScheduler(
+            lambda y: model(y, physics),
+            stats=self.call_stats,
+            fuse=self.fuse_calls,
+            timed=self.time_calls,
+        )
+
+        y_plus, y_minus = self.r2r_loss.perturb(y)
+        r2r_call = scheduler.submit(y_plus, label="r2r")
 
-    # slightly modified for consistent input noise
-    # base code available at https://github.com/deepinv/deepinv/blob/0b40ff5ac2f546987067465796ea55e5984d6967/deepinv/loss/ei.py
-    def ei_loss(self, y, physics, model, **kwargs):
         epsilon1 = 0.5 * self.sigma * torch.randn_like(y)
-        x1 = model(y + epsilon1, physics)
+        ei_call = scheduler.submit(y + epsilon1, label="ei")
+
+        output = r2r_call.result()
+        r2r_loss = self.r2r_loss.metric(physics.A(output), y_minus)
 
+        return r2r_loss + self.ei_loss(ei_call.result(), physics, scheduler)
+
+    # slightly modified for consistent input noise
+    # base code available at https://github.com/deepinv/deepinv/blob/0b40ff5ac2f546987067465796ea55e5984d6967/deepinv/loss/ei.py
+    def ei_loss(self, x1, physics, scheduler):
         if self.no_grad:
             with torch.no_grad():
                 x2 = self.T(x1)
@@ -52,6 +86,9 @@ class R2REILoss(Module):
         y2 = physics.A(x2)
 
         epsilon2 = 1.5 * self.sigma * torch.randn_like(y2)
-        x3 = model(y2 + epsilon2, physics)
+        x3 = scheduler.submit(y2 + epsilon2, label="ei_transformed").result()
 
         return self.metric(x3, x2)
+
+    def get_call_stats(self):
+        return self.call_stats
@@ -4,8 +4,7 @@ import torch.nn as nn
 import numpy as np
 
 
-def mc_div(y1, y, model, physics, tau, margin=0):
-    assert margin is not None
+def sample_probe(y, margin=0):
     if margin == 0:
         b = torch.randn_like(y)
     else:
@@ -20,21 +19,60 @@ def mc_div(y1, y, model, physics, tau, margin=0):
         b[:, :, margin:-margin, margin:-margin] = torch.randn(
             *ip_shape, device=y.device, dtype=y.dtype
         )
+    return b
+
+
+def mc_div(y1, y, model, physics, tau, margin=0):
+    assert margin is not None
+    b = sample_probe(y, margin=margin)
 
     y2 = physics.A(model(y + b * tau))
 
+    return probe_div(y1, y2, b, tau, margin=margin)
+
+
+def probe_div(y1, y2, b, tau, margin=0):
     out = b * (y2 - y1) / tau
 
     if margin != 0:
-        out = out[:, :, margin:-margin, margin:-margin]
+        out = out[..., margin:-margin, margin:-margin]
 
     out = out.mean()
     return out
 
 
+# NOTE: The measurements and their K perturbed versions are concatenated
+# along the batch dimension and the model is only run once on all of them.
+# The probes are stacked in a tensor of size (K, B, C, H, W). They are drawn
+# before the model is run and the model draws its own random numbers (e.g.
+# for drop-path) once for all the inputs, so the loss only matches the one
+# computed sequentially for deterministic models.
+def batched_forward(y, model, tau, probes=1, margin=0):
+    assert margin is not None
+    b = torch.stack([sample_probe(y, margin=margin) for _ in range(probes)])
+    inputs = torch.cat([y.unsqueeze(0), y + b * tau]).flatten(0, 1)
+    outputs = model(inputs)
+    outputs = outputs.unflatten(0, (probes + 1, y.size(0)))
+    x_net, x_probes = outputs[0], outputs[1:]
+    return x_net, (b, x_probes)
+
+
 class SureGaussianLoss(nn.Module):
+    # NOTE: The divergence is averaged over several Monte-Carlo probes if
+    # probes > 1. If batched_probes is set, the reconstruction and the outputs
+    # for the probes are computed by a single forward pass of the model using
+    # batched_forward, and passed to forward as x_net and probes. This
+    # changes the random numbers drawn by stochastic models, see
+    # batched_forward.
     def __init__(
-        self, sigma, tau=1e-2, margin=0, cropped_div=False, averaged_cst=False
+        self,
+        sigma,
+        tau=1e-2,
+        margin=0,
+        cropped_div=False,
+        averaged_cst=False,
+        probes=1,
+        batched_probes=False,
     ):
         super(SureGaussianLoss, self).__init__()
         self.name = "SureGaussian"
@@ -44,15 +82,36 @@ class SureGaussianLoss(nn.Module):
         self.margin = margin
         self.cropped_div = cropped_div
         self.averaged_cst = averaged_cst
+        assert probes >= 1
+        self.probes = probes
+        self.batched_probes = batched_probes
 
-    def forward(self, y, x_net, physics, model, **kwargs):
+    def batched_forward(self, y, model):
+        return batched_forward(
+            y, model, self.tau, probes=self.probes, margin=self.div_margin()
+        )
+
+    def div_margin(self):
+        return self.margin if self.cropped_div else 0
+
+    def forward(self, y, x_net, physics, model, probes=None, **kwargs):
         y1 = physics.A(x_net)
 
-        if not self.cropped_div:
-            div = mc_div(y1, y, model, physics, self.tau)
+        margin = self.div_margin()
+        if probes is not None:
+            b, x_probes = probes
+            y2 = physics.A(x_probes.flatten(0, 1)).unflatten(0, x_probes.shape[:2])
+            div = probe_div(y1, y2, b, self.tau, margin=margin)
         else:
-            div = mc_div(y1, y, model, physics, self.tau, margin=self.margin)
+            div = 0
+            for _ in range(self.probes):
+                div += mc_div(y1, y, model, physics, self.tau, margin=margin)
+            div = div / self.probes
+
+        return self.combine(y, y1, div, physics)
 
+    # NOTE: The divergence is the one of mc_div or probe_div, and y1 is A(x_net).
+    def combine(self, y, y1, div, physics):
         div = 2 * self.sigma2 * div
 
         mse = y1 - y
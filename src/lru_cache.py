@@ -0,0 +1,61 @@
+import torch
+from collections import OrderedDict
+from threading import Lock
+
+
+# NOTE: Most cached quantities, e.g. the OTFs of the operators, only depend on
+# the size, the dtype and the device of the tensors they are applied to.
+def get_tensor_key(shape, dtype, device):
+    return (tuple(shape), dtype, torch.device(device))
+
+
+class LRUCache:
+    # NOTE: The cache can be shared by several threads, e.g. the threads
+    # processing the tiles of an image. The lock is only held while accessing
+    # the entries and not while building them, so an entry missing for
+    # several threads at once might be built more than once.
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key, build):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry
+            self.misses += 1
+
+        entry = build()
+
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            # evict the least recently used entries
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+        }
+
+    # NOTE: The copies of the cache, e.g. the ones of the operators copied to
+    # other devices or sent to DataLoader workers, start out empty and with a
+    # lock of their own.
+    def __getstate__(self):
+        return {"max_size": self.max_size}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
@@ -1,14 +1,14 @@
 import torch
 from deepinv.physics import GaussianNoise
+from hashlib import sha256
 from os.path import exists
 
-from rng import fork_rng
+from rng import seeded_randn, seeded_randn_window
 from .ct_like_filter import CTLikeFilter
 from .downsampling import Downsampling
-from .kernels import get_kernel
+from .kernels import KernelSampler, get_kernel
 from .blur import Blur, BlurV2
-
-# NOTE: There should ideally be a class combining the blur and downsampling operators.
+from .blur_downsampling import BlurDownsampling
 
 
 # NOTE: This might be better as a subclass of torch.Tensor. (See
@@ -35,22 +35,57 @@ class PhysicsManager:
         device,
         noise_level,
         v2,
+        noise_tile_size,
+        sr_operator,
     ):
+        self.kernel_sampler = None
         if task == "deblurring":
-            blur_kernel = BlurKernel(**blueprint[BlurKernel.__name__])
+            # NOTE: If several kernels are given, e.g. Gaussian_R1,Gaussian_R3,
+            # a kernel is drawn among them for every degraded image, and the
+            # operator of the first one is used everywhere else, e.g. by the
+            # models.
+            kernel_path = blueprint[BlurKernel.__name__]["kernel_path"]
+            if kernel_path is not None and "," in kernel_path:
+                names = kernel_path.split(",")
+                self.kernel_sampler = KernelSampler(names)
+                kernel_path = names[0]
+            blur_kernel = BlurKernel(kernel_path=kernel_path)
             kernel = blur_kernel.to_tensor(device)
             if v2:
-                physics = BlurV2(kernel=kernel)
+                physics = BlurV2(kernel=kernel, **blueprint[BlurV2.__name__])
             else:
                 physics = Blur(filter=kernel, padding="circular", device=device)
         elif task == "sr":
-            physics = Downsampling(antialias=True, **blueprint[Downsampling.__name__])
+            # NOTE: The images are either downsampled using bicubic
+            # interpolation, or blurred using the given kernel and decimated.
+            if sr_operator == "bicubic":
+                physics = Downsampling(
+                    antialias=True, **blueprint[Downsampling.__name__]
+                )
+            elif sr_operator == "blur_decimate":
+                kernel_path = blueprint[BlurKernel.__name__]["kernel_path"]
+                if kernel_path is None:
+                    raise ValueError("The blur_decimate operator requires a kernel")
+                # NOTE: The kernel banks are only supported for deblurring.
+                if "," in kernel_path:
+                    raise ValueError(
+                        f"The blur_decimate operator requires a single kernel: {kernel_path}"
+                    )
+                blur_kernel = BlurKernel(**blueprint[BlurKernel.__name__])
+                kernel = blur_kernel.to_tensor(device)
+                physics = BlurDownsampling(
+                    kernel=kernel, rate=blueprint[Downsampling.__name__]["rate"]
+                )
+            else:
+                raise ValueError(f"Unknown SR operator: {sr_operator}")
         elif task == "invert_a_tomography_like_filter":
             physics = CTLikeFilter()
         else:
             raise ValueError(f"Unknown task: {task}")
 
         physics.noise_model = GaussianNoise(sigma=noise_level / 255)
+        self.noise_level = noise_level
+        self.noise_tile_size = noise_tile_size
 
         # NOTE: These are meant to go.
         setattr(self, "task", task)
@@ -62,16 +97,145 @@ class PhysicsManager:
     def get_physics(self):
         return self.physics
 
+    # NOTE: The configuration is meant to identify the measurements produced
+    # by the operator, e.g. to cache them.
+    def get_config(self):
+        config = {
+            "task": self.task,
+            "noise_level": self.noise_level,
+            "operator": type(self.physics).__name__,
+        }
+        if self.task in ["deblurring", "sr"] and hasattr(self.physics, "filter"):
+            kernel = self.physics.filter.detach().to("cpu", torch.float64)
+            config["kernel"] = sha256(kernel.numpy().tobytes()).hexdigest()
+        if self.kernel_sampler is not None:
+            config["kernels"] = self.kernel_sampler.names
+        if self.task == "sr":
+            config["rate"] = self.physics.rate
+        if self.noise_tile_size is not None:
+            config["noise_tile_size"] = self.noise_tile_size
+        return config
+
+    # NOTE: The operator applies a different kernel to each image of the
+    # batch, all at once.
+    def get_sampled_physics(self, seeds, device):
+        kernels = self.kernel_sampler.sample(seeds, device=device)
+        # NOTE: The operator of the bank is tiled like the base operator. It
+        # is only used once, and its cache only holds the OTFs of the sizes
+        # of the tiles, of which there are at most four.
+        if isinstance(self.physics, BlurV2):
+            physics = BlurV2(
+                kernel=kernels,
+                otf_cache_size=4,
+                tile_size=self.physics.tile_size,
+                tile_workers=self.physics.tile_workers,
+            )
+        else:
+            physics = Blur(filter=kernels, padding="circular", device=device)
+        return physics
+
+    # NOTE: The noise of a seeded image is drawn from a generator of its own,
+    # making it independent of the other images of the batch and of the
+    # worker loading it, and the global RNG is left untouched.
     def randomly_degrade(self, x, seed):
-        # NOTE: Forking the RNG and setting the seed could be done all at once.
-        preserve_rng_state = seed is not None
-        with fork_rng(enabled=preserve_rng_state):
-            if seed is not None:
-                torch.manual_seed(seed)
+        if self.kernel_sampler is not None:
+            physics = self.get_sampled_physics([seed], device=x.device)
+            y = physics.A(x)
+        else:
+            y = self.physics.A(x)
+        return self.add_noise(y, seed=seed)
+
+    # NOTE: If the measurement is a crop, the noise is the corresponding crop
+    # of the noise which would be added to the whole measurement. Unless the
+    # seeded noise is drawn by tiles, the noise of the whole measurement,
+    # whose shape is given, is drawn and cropped, which costs as much as
+    # drawing the noise of the whole measurement.
+    def add_noise(self, y, seed, shape=None, location=None):
+        if seed is None:
+            noise = torch.randn_like(y)
+        elif self.noise_tile_size is not None:
+            noise = seeded_randn_window(
+                y.shape,
+                seed=seed,
+                device=y.device,
+                dtype=y.dtype,
+                tile_size=self.noise_tile_size,
+                location=(0, 0) if location is None else location,
+            )
+        else:
+            if shape is None:
+                shape = y.shape
+            noise = seeded_randn(shape, seed=seed, device=y.device, dtype=y.dtype)
+            if location is not None:
+                i, j = location
+                noise = noise[..., i : i + y.shape[-2], j : j + y.shape[-1]]
 
-            x = self.physics.A(x)
-            x = self.physics.noise_model(x)
-        return x
+        assert isinstance(self.physics.noise_model, GaussianNoise)
+        return y + noise * self.physics.noise_model.sigma
+
+    # NOTE: The margin is the number of pixels of the measurements around a
+    # crop which depend on pixels outside of it, and which can be trimmed
+    # after degrading a crop of the ground truth image to get the exact same
+    # result as when degrading the whole image and cropping it afterwards.
+    # It is None for operators which are not local.
+    def get_patch_margin(self):
+        # the degraded crops are obtained using the operator of a single kernel
+        if self.kernel_sampler is not None:
+            return None
+        if self.task == "deblurring":
+            kernel = self.physics.filter
+            margin = max(kernel.shape[-2], kernel.shape[-1]) // 2
+            # the blur operators use circular boundary conditions
+            circular = True
+        elif self.task == "sr" and isinstance(self.physics, BlurDownsampling):
+            kernel = self.physics.filter
+            radius = max(kernel.shape[-2], kernel.shape[-1]) // 2
+            # the radius of the kernel in pixels of the measurements
+            margin = -(-radius // self.physics.rate)
+            circular = True
+        elif self.task == "sr":
+            # the support of the antialiased bicubic kernel spans two pixels
+            # of the measurements on each side
+            margin = 2
+            circular = False
+        else:
+            return None
+        return margin, circular
+
+    # NOTE: This is equivalent to degrading the images one by one using
+    # randomly_degrade, but the operator is applied to the whole batch at once.
+    def degrade_batch(self, x, seeds):
+        assert len(seeds) == x.shape[0]
+        if self.kernel_sampler is not None:
+            physics = self.get_sampled_physics(seeds, device=x.device)
+            y = physics.A(x)
+        else:
+            y = self.physics.A(x)
+        return self.add_noise_batch(y, seeds=seeds)
+
+    def add_noise_batch(self, y, seeds):
+        if all(seed is None for seed in seeds):
+            noise = torch.randn_like(y)
+        else:
+            noise = torch.empty_like(y)
+            for i, seed in enumerate(seeds):
+                if seed is None:
+                    noise[i] = torch.randn_like(y[i])
+                elif self.noise_tile_size is not None:
+                    noise[i] = seeded_randn_window(
+                        y.shape[1:],
+                        seed=seed,
+                        device=y.device,
+                        dtype=y.dtype,
+                        tile_size=self.noise_tile_size,
+                    )
+                else:
+                    noise[i] = seeded_randn(
+                        y.shape[1:], seed=seed, device=y.device, dtype=y.dtype
+                    )
+
+        assert isinstance(self.physics.noise_model, GaussianNoise)
+        return y + noise * self.physics.noise_model.sigma
 
 
 # NOTE: The borders of blurred out images should be cropped out in order to avoid boundary effects.
@@ -83,6 +247,8 @@ def get_physics(args, device):
         "task": args.task,
         "noise_level": args.noise_level,
         "v2": args.physics_v2,
+        "noise_tile_size": args.PhysicsManager__noise_tile_size,
+        "sr_operator": args.sr_operator,
     }
 
     blueprint[BlurKernel.__name__] = {
@@ -94,6 +260,12 @@ def get_physics(args, device):
         "true_adjoint": args.physics_true_adjoint,
     }
 
+    blueprint[BlurV2.__name__] = {
+        "tile_size": args.BlurV2__tile_size,
+        "tile_workers": args.BlurV2__tile_workers,
+        "separable": args.BlurV2__separable,
+    }
+
     physics_manager = PhysicsManager(
         blueprint=blueprint,
         device=device,
@@ -1,10 +1,12 @@
 # Code obtained from
 # https://github.com/deepinv/deepinv/blob/a1ef4a8a8de0eacb1c0d0fb463a721de7827415e/deepinv/physics/blur.py
 import torch
-from torch.nn.functional import pad
+from functools import partial
 import torch.nn.functional as F
 from deepinv.physics.forward import LinearPhysics
-from deepinv.physics import adjoint_function
+from lru_cache import LRUCache, get_tensor_key
+from ..kernels import get_separable_factors
+from ..tiling import apply_tiled
 
 def extend_filter(filter):
     b, c, h, w = filter.shape
@@ -31,16 +33,47 @@ def extend_filter(filter):
     return out
 
 
+def depthwise_conv(x, filter, transpose=False):
+    r"""
+    Filter every channel of every image of x at once using a grouped convolution.
+
+    :param torch.Tensor x: Image of size (B,C,H,W).
+    :param torch.Tensor filter: Filter of size (1,1,H,W) shared by all the images, or (B,1,H,W) for filtering each image with its own filter.
+    :param bool transpose: compute the transposed convolution instead, i.e. :meth:`torch.nn.functional.conv_transpose2d`.
+    """
+    b, c, h, w = x.shape
+
+    # NOTE: The transposed convolution is computed as the convolution of the
+    # zero-padded input with the flipped filter as grouped transposed
+    # convolutions are much slower on CPU.
+    if transpose:
+        kh, kw = filter.shape[-2:]
+        x = F.pad(x, (kw - 1, kw - 1, kh - 1, kh - 1))
+        filter = filter.flip(-1).flip(-2)
+        h, w = x.shape[-2:]
+
+    if filter.shape[0] == 1:
+        weight = filter.expand(c, -1, -1, -1)
+        return F.conv2d(x, weight, groups=c)
+
+    # NOTE: The images are stacked in the channel dimension so that each of
+    # them is filtered using its own filter.
+    assert filter.shape[0] == b
+    weight = filter.repeat_interleave(c, dim=0)
+    x = x.reshape(1, b * c, h, w)
+    x = F.conv2d(x, weight, groups=b * c)
+    return x.reshape(b, c, x.shape[-2], x.shape[-1])
+
+
 def conv(x, filter, padding):
     r"""
     Convolution of x and filter. The transposed of this operation is conv_transpose(x, filter, padding)
 
     :param x: (torch.Tensor) Image of size (B,C,W,H).
-    :param filter: (torch.Tensor) Filter of size (1,C,W,H) for colour filtering or (1,1,W,H) for filtering each channel with the same filter.
+    :param filter: (torch.Tensor) Filter of size (1,C,W,H) for colour filtering, (1,1,W,H) for filtering each channel with the same filter or (B,1,W,H) for filtering each image with its own filter.
     :param padding: (string) options = 'valid','circular','replicate','reflect'. If padding='valid' the blurred output is smaller than the image (no padding), otherwise the blurred output has the same size as the image.
 
     """
-    b, c, h, w = x.shape
 
     filter = filter.flip(-1).flip(
         -2
@@ -51,23 +84,13 @@ def conv(x, filter, padding):
     ph = (filter.shape[2] - 1) / 2
     pw = (filter.shape[3] - 1) / 2
 
-    if padding == "valid":
-        h_out = int(h - 2 * ph)
-        w_out = int(w - 2 * pw)
-    else:
-        h_out = h
-        w_out = w
+    if padding != "valid":
         pw = int(pw)
         ph = int(ph)
         x = F.pad(x, (pw, pw, ph, ph), mode=padding, value=0)
 
     if filter.shape[1] == 1:
-        y = torch.zeros((b, c, h_out, w_out), device=x.device)
-        for i in range(b):
-            for j in range(c):
-                y[i, j, :, :] = F.conv2d(
-                    x[i, j, :, :].unsqueeze(0).unsqueeze(1), filter, padding="valid"
-                ).unsqueeze(1)
+        y = depthwise_conv(x, filter.to(x.dtype))
     else:
         y = F.conv2d(x, filter, padding="valid")
 
@@ -79,14 +102,12 @@ def conv_transpose(y, filter, padding):
     Tranposed convolution of x and filter. The transposed of this operation is conv(x, filter, padding)
 
     :param torch.tensor x: Image of size (B,C,W,H).
-    :param torch.tensor filter: Filter of size (1,C,W,H) for colour filtering or (1,C,W,H) for filtering each channel with the same filter.
+    :param torch.tensor filter: Filter of size (1,C,W,H) for colour filtering, (1,1,W,H) for filtering each channel with the same filter or (B,1,W,H) for filtering each image with its own filter.
     :param str padding: options are ``'valid'``, ``'circular'``, ``'replicate'`` and ``'reflect'``.
         If ``padding='valid'`` the blurred output is smaller than the image (no padding)
         otherwise the blurred output has the same size as the image.
     """
 
-    b, c, h, w = y.shape
-
     filter = filter.flip(-1).flip(
         -2
     )  # In order to perform convolution and not correlation like Pytorch native conv
@@ -96,23 +117,11 @@ def conv_transpose(y, filter, padding):
     ph = (filter.shape[2] - 1) / 2
     pw = (filter.shape[3] - 1) / 2
 
-    h_out = int(h + 2 * ph)
-    w_out = int(w + 2 * pw)
     pw = int(pw)
     ph = int(ph)
 
-    x = torch.zeros((b, c, h_out, w_out), device=y.device)
     if filter.shape[1] == 1:
-        for i in range(b):
-            if filter.shape[0] > 1:
-                f = filter[i, :, :, :].unsqueeze(0)
-            else:
-                f = filter
-
-            for j in range(c):
-                x[i, j, :, :] = F.conv_transpose2d(
-                    y[i, j, :, :].unsqueeze(0).unsqueeze(1), f
-                )
+        x = depthwise_conv(y, filter.to(y.dtype), transpose=True)
     else:
         x = F.conv_transpose2d(y, filter)
 
@@ -195,33 +204,159 @@ class Blur(LinearPhysics):
 
 
 class BlurV2(LinearPhysics):
-    def __init__(self, kernel):
+    # NOTE: The OTFs, i.e. the Fourier transforms of the kernel padded to the
+    # size of the images, are cached as they only depend on the size, the
+    # dtype and the device of the images.
+    #
+    # NOTE: If a tile size is given, the operator and its adjoint are applied
+    # to larger images tile by tile, with the radius of the kernel as halo,
+    # which bounds the size of the intermediates. The pseudo-inverse and the
+    # proximal operator are not local and they still use whole-image FFTs.
+    #
+    # NOTE: If separable is set and the kernel is the outer product of two 1D
+    # kernels, the operator and its adjoint filter the columns and then the
+    # rows of the images with circular 1D convolutions instead of using the
+    # FFT. This is opt-in as the depthwise convolutions are several times
+    # slower than the FFT on CPU, and it is only worth it on devices where
+    # it was measured to be faster.
+    def __init__(
+        self,
+        kernel,
+        otf_cache_size=8,
+        dagger_eps=1e-3,
+        tile_size=None,
+        tile_workers=1,
+        separable=False,
+    ):
         super().__init__()
         self.kernel = kernel
+        self.factors = get_separable_factors(kernel) if separable else None
+        self.tile_size = tile_size
+        self.tile_workers = tile_workers
         # NOTE: This is meant to go.
         self.filter = self.kernel
         self.fft_norm = "backward"
+        self.dagger_eps = dagger_eps
+        self.otf_cache = LRUCache(otf_cache_size)
 
     def A(self, x):
-        y = x
+        if self.uses_separable_conv(x):
+            return self.separable_conv(x, transpose=False)
+        if self.uses_tiling(x):
+            return self.apply_tiled(x, transpose=False)
+        return self.filter2d(x, transpose=False)
+
+    def filter2d(self, x, transpose):
+        shape = x.shape[-2:]
+        otf, otf_conj = self.get_otf(shape, dtype=x.dtype, device=x.device)
+        if transpose:
+            otf = otf_conj
+
+        y = torch.fft.rfft2(x, dim=(-2, -1), norm=self.fft_norm)
+        y = otf.broadcast_to(y.shape) * y
+        y = torch.fft.irfft2(y, dim=(-2, -1), s=shape, norm=self.fft_norm)
 
-        shape = y.shape[-2:]
+        return y
 
-        kernel = self.kernel.to(y.device, y.dtype)
-        psf = torch.zeros(shape, device=y.device, dtype=y.dtype)
-        psf[: kernel.shape[-2], : kernel.shape[-1]] = kernel
+    def uses_tiling(self, x):
+        if self.tile_size is None:
+            return False
+        return x.shape[-2] > self.tile_size or x.shape[-1] > self.tile_size
+
+    # NOTE: The output pixels depend on the input pixels which are at most
+    # k // 2 pixels away along each dimension, for kernels of size k, and
+    # this holds for the adjoint too.
+    def apply_tiled(self, x, transpose):
+        halo = max(self.kernel.shape[-2], self.kernel.shape[-1]) // 2
+        return apply_tiled(
+            partial(self.filter2d, transpose=transpose),
+            x,
+            tile_size=self.tile_size,
+            halo=halo,
+            workers=self.tile_workers,
+        )
+
+    # NOTE: The conjugate of the OTF is the OTF of the adjoint.
+    def get_otf(self, shape, dtype, device):
+        key = get_tensor_key(shape, dtype, device)
+        return self.otf_cache.get(
+            key, partial(self.build_otf, shape, dtype=dtype, device=device)
+        )
+
+    # NOTE: Kernel banks of size (B, 1, k, k) result in one OTF per image.
+    def build_otf(self, shape, dtype, device):
+        kernel = self.kernel.to(device, dtype)
+        psf = torch.zeros((*kernel.shape[:-2], *shape), device=device, dtype=dtype)
+        psf[..., : kernel.shape[-2], : kernel.shape[-1]] = kernel
         psf = psf.roll(
-                (-(kernel.shape[-2] // 2), -(kernel.shape[-1] // 2)),
-                dims=(-2, -1)
-            )
+            (-(kernel.shape[-2] // 2), -(kernel.shape[-1] // 2)), dims=(-2, -1)
+        )
         otf = torch.fft.rfft2(psf, dim=(-2, -1), norm=self.fft_norm)
+        return otf, otf.conj()
 
-        y = torch.fft.rfft2(y, dim=(-2, -1), norm=self.fft_norm)
-        y = otf.broadcast_to(y.shape) * y
-        y = torch.fft.irfft2(y, dim=(-2, -1), s=shape, norm=self.fft_norm)
-
-        return y
+    def get_cache_stats(self):
+        return self.otf_cache.get_stats()
 
     def A_adjoint(self, y):
-        fn = adjoint_function(self.A, y.shape, device=y.device, dtype=y.dtype)
-        return fn(y)
+        if self.uses_separable_conv(y):
+            return self.separable_conv(y, transpose=True)
+        if self.uses_tiling(y):
+            return self.apply_tiled(y, transpose=True)
+        return self.filter2d(y, transpose=True)
+
+    # NOTE: The circular padding can't wrap around more than once, so the
+    # images smaller than the kernel use the FFT.
+    def uses_separable_conv(self, x):
+        if self.factors is None:
+            return False
+        u, v = self.factors
+        return x.shape[-2] >= len(u) and x.shape[-1] >= len(v)
+
+    # NOTE: The padding matches the position of the center of the kernel in
+    # the PSF used by the FFT, see build_otf, including for kernels of even
+    # size.
+    def separable_conv(self, x, transpose):
+        c = x.shape[1]
+        for dim, factor in [(-2, self.factors[0]), (-1, self.factors[1])]:
+            k = len(factor)
+            before, after = k - 1 - k // 2, k // 2
+            factor = factor.to(x.device, x.dtype)
+            # the correlation with the flipped factor is the convolution
+            if not transpose:
+                factor = factor.flip(0)
+            else:
+                before, after = after, before
+            if dim == -2:
+                padding = (0, 0, before, after)
+                weight = factor.reshape(1, 1, k, 1)
+            else:
+                padding = (before, after, 0, 0)
+                weight = factor.reshape(1, 1, 1, k)
+            x = F.pad(x, padding, mode="circular")
+            x = F.conv2d(x, weight.expand(c, -1, -1, -1), groups=c)
+        return x
+
+    # NOTE: The pseudo-inverse is regularized as the OTFs of most kernels,
+    # e.g. Gaussian kernels, vanish at high frequencies. The result is the
+    # Tikhonov-regularized solution conj(H) Y / (|H|^2 + eps).
+    def A_dagger(self, y, eps=None):
+        if eps is None:
+            eps = self.dagger_eps
+        return self.solve_normal_equation(self.A_adjoint(y), weight=eps)
+
+    # NOTE: The proximal operator of 1/2 ||Ax - y||^2 is computed in closed
+    # form instead of using the conjugate gradient method.
+    def prox_l2(self, z, y, gamma):
+        b = self.A_adjoint(y) + 1 / gamma * z
+        return self.solve_normal_equation(b, weight=1 / gamma)
+
+    # solves (A^T A + weight I) x = b
+    def solve_normal_equation(self, b, weight):
+        shape = b.shape[-2:]
+        otf, _ = self.get_otf(shape, dtype=b.dtype, device=b.device)
+
+        x = torch.fft.rfft2(b, dim=(-2, -1), norm=self.fft_norm)
+        x = x / (otf.abs() ** 2 + weight).broadcast_to(x.shape)
+        x = torch.fft.irfft2(x, dim=(-2, -1), s=shape, norm=self.fft_norm)
+
+        return x
@@ -0,0 +1,105 @@
+import torch
+from deepinv.physics import LinearPhysics
+from functools import partial
+from lru_cache import LRUCache, get_tensor_key
+
+
+class BlurDownsampling(LinearPhysics):
+    r"""
+    Blur operator followed by a decimation, i.e. :math:`y = S(k * x)` where the
+    convolution uses circular boundary conditions and :math:`S` keeps one
+    pixel out of ``rate`` along each dimension.
+
+    Both are applied at once in the Fourier domain: the spectrum of the
+    blurred image is folded onto the low resolution frequencies. The adjoint
+    and the pseudo-inverse use the same polyphase structure, e.g. :math:`AA^T`
+    is diagonal in the Fourier domain of the measurements.
+
+    :param torch.Tensor kernel: Tensor of size (1, 1, H, W) containing the blur kernel.
+    :param int rate: downsampling rate.
+    :param int otf_cache_size: number of image sizes for which the OTF is cached.
+    :param float dagger_eps: regularization of the pseudo-inverse.
+    """
+
+    def __init__(self, kernel, rate, otf_cache_size=8, dagger_eps=1e-3):
+        super().__init__()
+        self.kernel = kernel
+        # NOTE: This is meant to go.
+        self.filter = self.kernel
+        self.rate = rate
+        self.otf_cache = LRUCache(otf_cache_size)
+        self.dagger_eps = dagger_eps
+
+    # NOTE: The images are cropped to a multiple of the rate beforehand, like
+    # interpolate ignores the last rows and columns.
+    def A(self, x):
+        r = self.rate
+        x = x[..., : x.shape[-2] // r * r, : x.shape[-1] // r * r]
+        otf, _, _ = self.get_otf(x.shape[-2:], dtype=x.dtype, device=x.device)
+        x = torch.fft.fft2(x, dim=(-2, -1))
+        x = self.fold(otf * x)
+        return torch.fft.ifft2(x, dim=(-2, -1)).real
+
+    def A_adjoint(self, y):
+        shape = (y.shape[-2] * self.rate, y.shape[-1] * self.rate)
+        _, otf_conj, _ = self.get_otf(shape, dtype=y.dtype, device=y.device)
+        y = torch.fft.fft2(y, dim=(-2, -1))
+        y = otf_conj * self.unfold(y)
+        return torch.fft.ifft2(y, dim=(-2, -1)).real
+
+    # NOTE: The pseudo-inverse A^T (AA^T + eps I)^{-1} is regularized as the
+    # OTFs of most kernels vanish at high frequencies.
+    def A_dagger(self, y, eps=None):
+        if eps is None:
+            eps = self.dagger_eps
+        shape = (y.shape[-2] * self.rate, y.shape[-1] * self.rate)
+        _, otf_conj, power = self.get_otf(shape, dtype=y.dtype, device=y.device)
+        y = torch.fft.fft2(y, dim=(-2, -1))
+        y = y / (power + eps)
+        y = otf_conj * self.unfold(y)
+        return torch.fft.ifft2(y, dim=(-2, -1)).real
+
+    # NOTE: The solution is computed in closed form using the Woodbury
+    # identity (I + gamma A^T A)^{-1} = I - gamma A^T (I + gamma AA^T)^{-1} A.
+    def prox_l2(self, z, y, gamma):
+        otf, otf_conj, power = self.get_otf(z.shape[-2:], dtype=z.dtype, device=z.device)
+        b = z + gamma * self.A_adjoint(y)
+        v = torch.fft.fft2(b, dim=(-2, -1))
+        v = self.fold(otf * v) / (1 + gamma * power)
+        v = otf_conj * self.unfold(v)
+        return b - gamma * torch.fft.ifft2(v, dim=(-2, -1)).real
+
+    # NOTE: Decimating an image amounts to averaging the rate x rate aliases
+    # of each low resolution frequency of its spectrum.
+    def fold(self, x):
+        r = self.rate
+        h, w = x.shape[-2] // r, x.shape[-1] // r
+        x = x.reshape(*x.shape[:-2], r, h, r, w)
+        return x.sum(dim=(-4, -2)) / r**2
+
+    # the adjoint of the decimation repeats the spectrum
+    def unfold(self, y):
+        return y.repeat(*([1] * (y.dim() - 2)), self.rate, self.rate)
+
+    # NOTE: The power is the Fourier transform of the kernel of AA^T, i.e.
+    # the folded squared modulus of the OTF.
+    def get_otf(self, shape, dtype, device):
+        assert shape[0] % self.rate == 0 and shape[1] % self.rate == 0
+        key = get_tensor_key(shape, dtype, device)
+        return self.otf_cache.get(
+            key, partial(self.build_otf, shape, dtype=dtype, device=device)
+        )
+
+    def build_otf(self, shape, dtype, device):
+        kernel = self.kernel.to(device, dtype)
+        psf = torch.zeros(shape, device=device, dtype=dtype)
+        psf[: kernel.shape[-2], : kernel.shape[-1]] = kernel
+        psf = psf.roll(
+            (-(kernel.shape[-2] // 2), -(kernel.shape[-1] // 2)), dims=(-2, -1)
+        )
+        otf = torch.fft.fft2(psf, dim=(-2, -1))
+        power = self.fold(otf.abs() ** 2)
+        return otf, otf.conj(), power
+
+    def get_cache_stats(self):
+        return self.otf_cache.get_stats()
@@ -1,39 +1,53 @@
 import torch
 from deepinv.physics import LinearPhysics
+from functools import partial
+from lru_cache import LRUCache, get_tensor_key
 
 
 class CTLikeFilter(LinearPhysics):
-    def __init__(self, eps=1):
+    # NOTE: The frequency responses of the operator and of its inverse are
+    # separable, and they are cached per size, dtype and device. The
+    # operator is self-adjoint as its frequency response is real and even.
+    def __init__(self, eps=1, otf_cache_size=8):
         super().__init__()
         self.eps = eps
+        self.otf_cache = LRUCache(otf_cache_size)
 
     def A(self, x):
-        x = self.filter1d(x, dim=2, inverse=True)
-        x = self.filter1d(x, dim=3, inverse=True)
-        return x
+        otf, _ = self.get_otf(x.shape[-2:], dtype=x.dtype, device=x.device)
+        return self.filter2d(x, otf)
 
-    def A_dagger(self, y):
-        y = self.filter1d(y, dim=2, inverse=False)
-        y = self.filter1d(y, dim=3, inverse=False)
-        return y
-
-    def filter1d(self, x, dim, inverse=False):
-        # we swap axes to make the last axis the one to be filtered
-        # making the code easier to understand
-        x = x.swapaxes(dim, -1)
-
-        n = x.shape[-1]
-        x = torch.fft.rfft(x, dim=-1)
-        otf = torch.arange(x.shape[-1], device=x.device).to(dtype=x.dtype)
-        otf = otf + self.eps
-        if inverse:
-            otf = 1 / otf
-
-        otf = otf.expand(x.shape)
-        x = x * otf
-        x = torch.fft.irfft(x, dim=-1, n=n)
+    def A_adjoint(self, y):
+        return self.A(y)
 
-        # restore axes order
-        x = x.swapaxes(dim, -1)
+    def A_dagger(self, y):
+        _, otf_inverse = self.get_otf(y.shape[-2:], dtype=y.dtype, device=y.device)
+        return self.filter2d(y, otf_inverse)
 
+    def filter2d(self, x, otf):
+        shape = x.shape[-2:]
+        x = torch.fft.rfft2(x, dim=(-2, -1))
+        x = x * otf
+        x = torch.fft.irfft2(x, dim=(-2, -1), s=shape)
         return x
+
+    # NOTE: The response to the frequency k along an axis is 1 / (|k| + eps)
+    # where |k| is the magnitude of the frequency, i.e. min(k, n - k) for the
+    # full spectrum computed along the first axis.
+    def get_otf(self, shape, dtype, device):
+        key = get_tensor_key(shape, dtype, device)
+        return self.otf_cache.get(
+            key, partial(self.build_otf, shape, dtype=dtype, device=device)
+        )
+
+    def build_otf(self, shape, dtype, device):
+        h, w = shape
+        u = torch.arange(h, device=device)
+        u = torch.minimum(u, h - u).to(dtype)
+        v = torch.arange(w // 2 + 1, device=device).to(dtype)
+        otf_inverse = (u + self.eps)[:, None] * (v + self.eps)[None, :]
+        otf = 1 / otf_inverse
+        return otf, otf_inverse
+
+    def get_cache_stats(self):
+        return self.otf_cache.get_stats()
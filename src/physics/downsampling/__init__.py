@@ -1,35 +1,76 @@
 import torch
 from deepinv.physics import LinearPhysics
+from functools import partial
+from lru_cache import LRUCache, get_tensor_key
 from torch.nn import Module
 from torch.nn.functional import interpolate
 
-from deepinv.physics import adjoint_function
-
 
 class Downsampling(LinearPhysics):
-    def __init__(self, rate, antialias, true_adjoint=False):
+    # NOTE: The operator is separable, i.e. A(x) = R x C^T where R and C
+    # downsample the columns and the rows of the images respectively. The
+    # matrices and their pseudo-inverses are cached per size when using the
+    # true adjoint.
+    def __init__(self, rate, antialias, true_adjoint=False, matrix_cache_size=8):
         super().__init__()
         self.rate = rate
         self.antialias = antialias
         self.true_adjoint = true_adjoint
+        self.matrix_cache = LRUCache(matrix_cache_size)
 
     def A(self, x):
         return interpolate(
             x, scale_factor=1 / self.rate, mode="bicubic", antialias=self.antialias
         )
 
-    def A_adjoint(self, y):
+    # NOTE: The images are assumed to be of size (H r, W r) for measurements
+    # of size (H, W) unless their size is given, e.g. if it isn't a multiple
+    # of the rate r.
+    def A_adjoint(self, y, shape=None):
         if self.true_adjoint:
-            # NOTE: It'd be better to avoid the intermediate callable variable.
-            input_size = (
-                y.shape[0],
-                y.shape[1],
-                y.shape[2] * self.rate,
-                y.shape[3] * self.rate,
-            )
-            A_adjoint = adjoint_function(self.A, input_size=input_size, device=y.device)
-            x = A_adjoint(y)
+            h, w = self.get_image_size(y, shape)
+            R, _ = self.get_matrix(h, y.dtype, y.device)
+            C, _ = self.get_matrix(w, y.dtype, y.device)
+            x = R.T @ y @ C
         else:
             # NOTE: This is deprecated.
             x = interpolate(y, scale_factor=self.rate, mode="bicubic")
         return x
+
+    # NOTE: The pseudo-inverse of A is the Kronecker product of the
+    # pseudo-inverses of R and C.
+    def A_dagger(self, y, shape=None, **kwargs):
+        if not self.true_adjoint:
+            return super().A_dagger(y, **kwargs)
+
+        h, w = self.get_image_size(y, shape)
+        _, R_dagger = self.get_matrix(h, y.dtype, y.device)
+        _, C_dagger = self.get_matrix(w, y.dtype, y.device)
+        return R_dagger @ y @ C_dagger.T
+
+    def get_image_size(self, y, shape):
+        if shape is None:
+            return y.shape[-2] * self.rate, y.shape[-1] * self.rate
+        h, w = shape[-2:]
+        assert (h // self.rate, w // self.rate) == tuple(y.shape[-2:])
+        return h, w
+
+    # NOTE: The matrix is obtained by downsampling images of the canonical
+    # basis which are constant along their rows. The rows are made of twice
+    # as many pixels as the rate as images downsampled to a single column
+    # are handled differently by interpolate.
+    def get_matrix(self, n, dtype, device):
+        key = get_tensor_key((n,), dtype, device)
+        return self.matrix_cache.get(
+            key, partial(self.build_matrix, n, dtype=dtype, device=device)
+        )
+
+    def build_matrix(self, n, dtype, device):
+        basis = torch.eye(n, dtype=dtype, device=device)
+        basis = basis.reshape(n, 1, n, 1).expand(-1, -1, -1, 2 * self.rate)
+        matrix = self.A(basis)[..., 0].reshape(n, -1).T
+        matrix_dagger = torch.linalg.pinv(matrix.to(torch.float64)).to(dtype)
+        return matrix, matrix_dagger
+
+    def get_cache_stats(self):
+        return self.matrix_cache.get_stats()
@@ -1,4 +1,6 @@
 import torch
+import torch.nn.functional as F
+from functools import lru_cache
 
 _table = {
     "Gaussian_R1": ("gaussian", 1),
@@ -10,6 +12,9 @@ _table = {
 }
 
 
+# NOTE: The kernels are only built once per process and the same tensors are
+# returned every time, meaning that they must never be modified in place.
+@lru_cache(maxsize=None)
 def get_kernel(name, dtype=torch.float64):
     assert name in _table, f"Unsupported kernel: {name}"
     blur_type, blur_level = _table[name]
@@ -26,3 +31,50 @@ def get_kernel(name, dtype=torch.float64):
         kernel = torch.ones(kernel_size, kernel_size, dtype=dtype)
         kernel = kernel / kernel.sum()
     return kernel
+
+
+# NOTE: The factors are obtained from the singular value decomposition of the
+# kernel, which is separable if it has a single non-negligible singular value.
+# They are None for kernel banks and for kernels which aren't separable.
+def get_separable_factors(kernel, rtol=1e-6):
+    if kernel.dim() > 2 and kernel.shape[:-2].numel() > 1:
+        return None
+    kernel = kernel.reshape(kernel.shape[-2:]).to(torch.float64)
+    U, S, Vh = torch.linalg.svd(kernel)
+    if len(S) > 1 and S[1] > rtol * S[0]:
+        return None
+    u = U[:, 0] * S[0].sqrt()
+    v = Vh[0, :] * S[0].sqrt()
+    if u.sum() < 0:
+        u, v = -u, -v
+    return u, v
+
+
+class KernelSampler:
+    # NOTE: The kernels are zero-padded to the same size, keeping their
+    # centers aligned, and stacked into a kernel bank of size (K, 1, k, k).
+    # The kernel of an image is drawn using its seed, offset so that it is
+    # independent of its noise.
+    def __init__(self, names, dtype=torch.float64, seed_offset=2**32):
+        kernels = [get_kernel(name, dtype) for name in names]
+        size = max(max(kernel.shape) for kernel in kernels)
+        bank = []
+        for kernel in kernels:
+            ph, pw = size - kernel.shape[0], size - kernel.shape[1]
+            kernel = F.pad(kernel, (pw // 2, pw - pw // 2, ph // 2, ph - ph // 2))
+            bank.append(kernel)
+        self.names = names
+        self.kernels = torch.stack(bank).unsqueeze(1)
+        self.seed_offset = seed_offset
+
+    def sample(self, seeds, device):
+        indices = []
+        for seed in seeds:
+            if seed is None:
+                generator = None
+            else:
+                generator = torch.Generator()
+                generator.manual_seed(seed + self.seed_offset)
+            index = torch.randint(len(self.names), size=(1,), generator=generator)
+            indices.append(index.item())
+        return self.kernels[indices].to(device)
@@ -0,0 +1,47 @@
+import torch
+from concurrent.futures import ThreadPoolExecutor
+
+
+def apply_tiled(fn, x, tile_size, halo, workers=1):
+    r"""
+    Apply a translation-invariant operator with circular boundary conditions
+    tile by tile (overlap-save).
+
+    Every tile is extended by a halo of pixels on each side, taken circularly
+    from the image, the operator is applied to the extended tile and the
+    halo is trimmed out. The result is exactly the one obtained on the whole
+    image as long as the halo is at least the radius of the operator, and
+    only the intermediates of as many tiles as there are workers are held in
+    memory at once.
+
+    :param callable fn: operator preserving the size of its input.
+    :param torch.Tensor x: Image of size (..., H, W).
+    :param int tile_size: size of the tiles without their halo.
+    :param int halo: number of pixels added on each side of the tiles.
+    :param int workers: number of threads processing the tiles.
+    """
+    h, w = x.shape[-2:]
+    row_starts = range(0, h, tile_size)
+    col_starts = range(0, w, tile_size)
+
+    def process(location):
+        i, j = location
+        th, tw = min(tile_size, h - i), min(tile_size, w - j)
+        rows = torch.arange(i - halo, i + th + halo, device=x.device) % h
+        cols = torch.arange(j - halo, j + tw + halo, device=x.device) % w
+        tile = x.index_select(-2, rows).index_select(-1, cols)
+        tile = fn(tile)
+        return tile[..., halo : halo + th, halo : halo + tw]
+
+    locations = [(i, j) for i in row_starts for j in col_starts]
+    if workers > 1:
+        # NOTE: PyTorch releases the GIL in its kernels, e.g. in FFTs.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            tiles = list(executor.map(process, locations))
+    else:
+        tiles = [process(location) for location in locations]
+
+    # the tiles are assembled without in-place writes to support autograd
+    n = len(col_starts)
+    rows = [torch.cat(tiles[k : k + n], dim=-1) for k in range(0, len(tiles), n)]
+    return torch.cat(rows, dim=-2)
@@ -1,5 +1,47 @@
-from torch.random import fork_rng as torch_fork_rng
+import torch
+from hashlib import blake2b
 
 
-def fork_rng(enabled):
-    return torch_fork_rng(enabled=enabled)
+# NOTE: The noise is the same as the one obtained by seeding the global RNG
+# of the device and sampling from it, but it leaves the global RNG untouched.
+# It only depends on the seed, whatever the process or the other samples.
+def seeded_randn(shape, seed, device, dtype):
+    generator = torch.Generator(device=device)
+    generator.manual_seed(seed)
+    return torch.randn(shape, generator=generator, device=device, dtype=dtype)
+
+
+def get_tile_seed(seed, row, col):
+    key = f"{seed},{row},{col}".encode()
+    return int.from_bytes(blake2b(key, digest_size=8).digest(), "little")
+
+
+# NOTE: The noise is drawn tile by tile, each tile from a generator seeded
+# using the seed and the location of the tile, so that a window of it can be
+# drawn without drawing the rest, and the noise of a window is the
+# corresponding window of the noise of the whole image. The tiles are always
+# drawn whole so that the noise at a pixel doesn't depend on the size of the
+# image.
+def seeded_randn_window(shape, seed, device, dtype, tile_size, location=(0, 0)):
+    i, j = location
+    h, w = shape[-2:]
+    rows = range(i // tile_size, -(-(i + h) // tile_size))
+    cols = range(j // tile_size, -(-(j + w) // tile_size))
+
+    tile_shape = (*shape[:-2], tile_size, tile_size)
+    noise = []
+    for row in rows:
+        tiles = [
+            seeded_randn(
+                tile_shape,
+                seed=get_tile_seed(seed, row, col),
+                device=device,
+                dtype=dtype,
+            )
+            for col in cols
+        ]
+        noise.append(torch.cat(tiles, dim=-1))
+    noise = torch.cat(noise, dim=-2)
+
+    top, left = i - rows[0] * tile_size, j - cols[0] * tile_size
+    return noise[..., top : top + h, left : left + w]
@@ -11,7 +11,13 @@ class DefaultArgParser(ArgumentParser):
             "--physics_true_adjoint", action=BooleanOptionalAction, default=False
         )
         self.add_argument("--sr_factor", type=int, default=None)
+        # NOTE: The blur and decimation operator uses the kernel given by
+        # --kernel, which is ignored by the default bicubic downsampling.
+        self.add_argument("--sr_operator", type=str, default="bicubic")
         self.add_argument("--noise_level", type=int, default=5)
+        # NOTE: If set, the seeded noise is drawn by tiles of this size, which
+        # changes the measurements but makes the noise of a crop cheap to draw.
+        self.add_argument("--PhysicsManager__noise_tile_size", type=int, default=None)
         self.add_argument("--dataset", type=str, default="div2k")
         self.add_argument(
             "--GroundTruthDataset__datasets_dir", type=str, default="./datasets"
@@ -30,11 +36,48 @@ class DefaultArgParser(ArgumentParser):
             dest="GroundTruthDataset__size",
             const=None,
         )
+        self.add_argument(
+            "--GroundTruthDataset__memoize_backend", type=str, default="memory"
+        )
+        self.add_argument(
+            "--GroundTruthDataset__memoize_max_bytes", type=int, default=None
+        )
+        # NOTE: The cache is written in the datasets directory and it must be
+        # cleared manually whenever the underlying images change.
+        self.add_argument(
+            "--GroundTruthDataset__disk_cache",
+            action=BooleanOptionalAction,
+            default=False,
+        )
+        self.add_argument(
+            "--GroundTruthDataset__disk_cache_dtype", type=str, default="float32"
+        )
+        self.add_argument(
+            "--GroundTruthDataset__sharded",
+            action=BooleanOptionalAction,
+            default=False,
+        )
+        # NOTE: The slices of the CT volume are read by slabs of consecutive
+        # slices and the most recently used slabs are kept in memory.
+        self.add_argument("--TomographyDataset__slab_size", type=int, default=16)
+        self.add_argument(
+            "--TomographyDataset__slab_cache_size", type=int, default=0
+        )
         self.add_argument(
             "--SyntheticDataset__unique_seeds",
             action=BooleanOptionalAction,
             default=True,
         )
+        self.add_argument(
+            "--SyntheticDataset__batched_degradation",
+            action=BooleanOptionalAction,
+            default=False,
+        )
+        self.add_argument(
+            "--SyntheticDataset__precomputed_measurements",
+            action=BooleanOptionalAction,
+            default=False,
+        )
         # NOTE: This should ideally be in the training script but it is easier
         # to keep it right here as the preparation of training pairs is
         # involved in the class Dataset (which itself should ideally be
@@ -64,3 +107,8 @@ class DefaultArgParser(ArgumentParser):
         )
         self.add_argument("--data_parallel_devices", type=str, default=None)
         self.add_argument("--physics_v2", action=BooleanOptionalAction, default=True)
+        self.add_argument("--BlurV2__tile_size", type=int, default=None)
+        self.add_argument("--BlurV2__tile_workers", type=int, default=1)
+        self.add_argument(
+            "--BlurV2__separable", action=BooleanOptionalAction, default=False
+        )
@@ -1,4 +1,5 @@
 import torch
+from functools import lru_cache
 from torch.nn import Module, functional as F
 
 
@@ -24,37 +25,58 @@ def sample_downsampling_parameters(image_count, device, dtype, rates):
     return downsampling_rate, center
 
 
+# NOTE: The base grid is shared by all the images of the batch, and only the
+# scale and the center of the transformation vary from an image to another.
+# It is broadcast against them instead of being repeated.
 def get_downsampling_grid(shape, downsampling_rate, center, dtype, device):
     b, _, h, w = shape
 
     # Compute the sampling grid for the scale transformation
+    grid = get_base_grid(h, w, dtype=dtype, device=torch.device(device))
+    grid = 1 / downsampling_rate.view(b, 1, 1, 1) * (grid - center) + center
+
+    return grid
+
+
+# NOTE: The grids are only built once per size, dtype and device and the same
+# tensors are returned every time, meaning that they must never be modified
+# in place.
+@lru_cache(maxsize=8)
+def get_base_grid(h, w, dtype, device):
     u = torch.arange(w, dtype=dtype, device=device)
     v = torch.arange(h, dtype=dtype, device=device)
     u = 2 / w * u - 1
     v = 2 / h * v - 1
     U, V = torch.meshgrid(u, v, indexing="ij")
     grid = torch.stack([V, U], dim=-1)
-    grid = grid.view(1, h, w, 2).repeat(b, 1, 1, 1)
-    grid = (
-        1 / downsampling_rate.view(b, 1, 1, 1).expand_as(grid) * (grid - center)
-        + center
-    )
-
-    return grid
+    return grid.view(1, h, w, 2)
 
 
+# NOTE: The rates are copied to the host at once and the images are grouped
+# by rate, so that each group is interpolated in a single call. The result is
+# a list of (indices, images) pairs as the size of the interpolated images
+# depends on the rate, where the indices are None if there's a single group.
 def alias_free_interpolate(x, downsampling_rate, interpolation_mode):
-    xs = []
-    for i in range(x.shape[0]):
+    groups = {}
+    for i, rate in enumerate(downsampling_rate.tolist()):
+        groups.setdefault(rate, []).append(i)
+
+    zs = []
+    for rate, indices in groups.items():
+        if len(indices) == x.shape[0]:
+            indices = None
+            z = x
+        else:
+            indices = torch.tensor(indices, device=x.device)
+            z = x.index_select(0, indices)
         z = F.interpolate(
-            x[i : i + 1, :, :, :],
-            scale_factor=downsampling_rate[i].item(),
+            z,
+            scale_factor=rate,
             mode=interpolation_mode,
             antialias=True,
         )
-        z = z.squeeze(0)
-        xs.append(z)
-    return torch.stack(xs)
+        zs.append((indices, z))
+    return zs
 
 
 def padded_downsampling_transform(
@@ -62,11 +84,6 @@ def padded_downsampling_transform(
 ):
     shape = x.shape
 
-    if antialiased:
-        x = alias_free_interpolate(
-            x, downsampling_rate=downsampling_rate, interpolation_mode=mode
-        )
-
     grid = get_downsampling_grid(
         shape=shape,
         downsampling_rate=downsampling_rate,
@@ -74,13 +91,40 @@ def padded_downsampling_transform(
         dtype=x.dtype,
         device=x.device,
     )
-    return F.grid_sample(
-        x,
-        grid,
-        mode=mode,
-        padding_mode=padding_mode,
-        align_corners=True,
+
+    if not antialiased:
+        return F.grid_sample(
+            x,
+            grid,
+            mode=mode,
+            padding_mode=padding_mode,
+            align_corners=True,
+        )
+
+    # the grid is in normalized coordinates and it fits all the groups
+    groups = alias_free_interpolate(
+        x, downsampling_rate=downsampling_rate, interpolation_mode=mode
     )
+    ys = []
+    for indices, z in groups:
+        if indices is not None:
+            group_grid = grid.index_select(0, indices)
+        else:
+            group_grid = grid
+        y = F.grid_sample(
+            z,
+            group_grid,
+            mode=mode,
+            padding_mode=padding_mode,
+            align_corners=True,
+        )
+        ys.append(y)
+
+    if len(groups) == 1:
+        return ys[0]
+    # scatter the images back to their original positions
+    order = torch.cat([indices for indices, _ in groups])
+    return torch.cat(ys).index_select(0, torch.argsort(order))
 
 
 class PaddedDownsamplingTransform(Module):
@@ -109,18 +153,14 @@ class PaddedDownsamplingTransform(Module):
         return x
 
 
+# NOTE: All the images are downsampled using the same rate.
 def normal_downsampling_transform(x, downsampling_rate, mode, antialiased):
-    xs = []
-    for i in range(x.shape[0]):
-        z = F.interpolate(
-            x[i : i + 1, :, :, :],
-            scale_factor=downsampling_rate,
-            mode=mode,
-            antialias=antialiased,
-        )
-        z = z.squeeze(0)
-        xs.append(z)
-    return torch.stack(xs)
+    return F.interpolate(
+        x,
+        scale_factor=downsampling_rate,
+        mode=mode,
+        antialias=antialiased,
+    )
 
 
 class NormalDownsamplingTransform(Module):
@@ -0,0 +1,39 @@
+import pytest
+import sys
+import torch
+from os.path import dirname, join
+
+# NOTE: The scripts are run with the src directory in the PYTHONPATH.
+sys.path.insert(0, join(dirname(dirname(__file__)), "src"))
+
+
+# NOTE: The images are drawn in double precision for the operators to be
+# compared up to rounding errors.
+@pytest.fixture
+def get_images():
+    def get_images(shape, seed):
+        generator = torch.Generator().manual_seed(seed)
+        return torch.randn(shape, generator=generator, dtype=torch.float64)
+
+    return get_images
+
+
+# NOTE: The asymmetric kernel is of even width, and the kernel bank holds one
+# kernel per image.
+@pytest.fixture
+def get_kernels():
+    from physics.kernels import get_kernel
+
+    def get_kernels(kind):
+        generator = torch.Generator().manual_seed(0)
+        if kind == "gaussian":
+            return get_kernel("Gaussian_R2")[None, None]
+        elif kind == "asymmetric":
+            kernel = torch.rand(1, 1, 5, 4, generator=generator, dtype=torch.float64)
+            return kernel / kernel.sum()
+        elif kind == "bank":
+            kernels = torch.rand(3, 1, 7, 7, generator=generator, dtype=torch.float64)
+            return kernels / kernels.sum(dim=(-2, -1), keepdim=True)
+        raise ValueError(f"Unknown kind: {kind}")
+
+    return get_kernels
@@ -0,0 +1,71 @@
+import pytest
+import torch
+from deepinv.physics import adjoint_function
+from functools import partial
+
+from physics.blur import BlurV2
+from physics.blur_downsampling import BlurDownsampling
+from physics.ct_like_filter import CTLikeFilter
+from physics.downsampling import Downsampling
+
+# NOTE: The sizes of the images include sizes which aren't multiples of the
+# rates, and sizes which are odd.
+CASES = [
+    ("blur_gaussian", (3, 2, 20, 17)),
+    ("blur_asymmetric", (3, 2, 20, 17)),
+    ("blur_bank", (3, 2, 20, 17)),
+    ("ct_like_filter", (2, 3, 16, 16)),
+    ("ct_like_filter", (2, 3, 17, 17)),
+    ("ct_like_filter", (1, 3, 16, 21)),
+    ("ct_like_filter", (1, 1, 15, 22)),
+    ("downsampling_2", (2, 3, 16, 12)),
+    ("downsampling_2", (2, 3, 17, 13)),
+    ("downsampling_3", (2, 3, 18, 21)),
+    ("downsampling_3", (2, 3, 20, 16)),
+    ("downsampling_4", (2, 3, 16, 24)),
+    ("downsampling_4", (2, 3, 19, 22)),
+    ("blur_downsampling_2", (2, 3, 24, 18)),
+    ("blur_downsampling_3", (2, 3, 21, 27)),
+    ("blur_downsampling_4", (2, 3, 32, 24)),
+]
+
+
+# NOTE: The adjoint of Downsampling needs the size of the images when it
+# isn't a multiple of the rate.
+def get_operator(name, x_shape, get_kernels):
+    kind, _, parameter = name.rpartition("_")
+    if kind == "blur":
+        physics = BlurV2(get_kernels(parameter))
+        A_adjoint = physics.A_adjoint
+    elif name == "ct_like_filter":
+        physics = CTLikeFilter()
+        A_adjoint = physics.A_adjoint
+    elif kind == "blur_downsampling":
+        physics = BlurDownsampling(get_kernels("asymmetric"), rate=int(parameter))
+        A_adjoint = physics.A_adjoint
+    elif kind == "downsampling":
+        physics = Downsampling(rate=int(parameter), antialias=True, true_adjoint=True)
+        A_adjoint = partial(physics.A_adjoint, shape=x_shape)
+    else:
+        raise ValueError(f"Unknown operator: {name}")
+    return physics, A_adjoint
+
+
+@pytest.mark.parametrize("name, x_shape", CASES)
+def test_adjoint_matches_autograd(name, x_shape, get_images, get_kernels):
+    physics, A_adjoint = get_operator(name, x_shape, get_kernels)
+    y = get_images(physics.A(get_images(x_shape, seed=0)).shape, seed=1)
+    A_adjoint_autograd = adjoint_function(
+        physics.A, input_size=x_shape, device=y.device, dtype=y.dtype
+    )
+    assert torch.allclose(A_adjoint(y), A_adjoint_autograd(y), rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("name, x_shape", CASES)
+def test_adjoint_dot_product(name, x_shape, get_images, get_kernels):
+    physics, A_adjoint = get_operator(name, x_shape, get_kernels)
+    x = get_images(x_shape, seed=0)
+    y = get_images(physics.A(x).shape, seed=1)
+    lhs = (physics.A(x) * y).sum()
+    rhs = (x * A_adjoint(y)).sum()
+    assert torch.allclose(lhs, rhs, rtol=1e-12, atol=0)
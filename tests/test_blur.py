@@ -0,0 +1,94 @@
+import pytest
+import torch
+from deepinv.optim.utils import conjugate_gradient
+
+from physics.blur import BlurV2
+
+
+KINDS = ["gaussian", "asymmetric", "bank"]
+SHAPE = (3, 2, 20, 17)
+
+
+# NOTE: The proximal operator of 1/2 ||Ax - y||^2 with step gamma solves
+# (A^T A + I / gamma) x = A^T y + z / gamma, and the pseudo-inverse solves
+# (A^T A + eps I) x = A^T y.
+@pytest.mark.parametrize("kind", KINDS)
+def test_prox_l2_matches_conjugate_gradient(kind, get_images, get_kernels):
+    physics = BlurV2(get_kernels(kind))
+    z = get_images(SHAPE, seed=1)
+    y = physics.A(get_images(SHAPE, seed=2))
+    gamma = 0.5
+    x = physics.prox_l2(z, y, gamma)
+
+    # each image is solved on its own as it may have its own kernel
+    for i in range(z.shape[0]):
+        if physics.kernel.shape[0] > 1:
+            kernel = physics.kernel[i : i + 1]
+        else:
+            kernel = physics.kernel
+        single = BlurV2(kernel)
+        b = single.A_adjoint(y[i : i + 1]) + z[i : i + 1] / gamma
+        x_cg = conjugate_gradient(
+            lambda v: single.A_adjoint(single.A(v)) + v / gamma,
+            b,
+            max_iter=1000,
+            tol=1e-12,
+        )
+        assert torch.allclose(x[i : i + 1], x_cg, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_dagger_solves_normal_equation(kind, get_images, get_kernels):
+    physics = BlurV2(get_kernels(kind), dagger_eps=1e-3)
+    y = get_images(SHAPE, seed=2)
+    x = physics.A_dagger(y)
+    lhs = physics.A_adjoint(physics.A(x)) + 1e-3 * x
+    assert torch.allclose(lhs, physics.A_adjoint(y), rtol=0, atol=1e-10)
+
+
+# NOTE: The separable kernels include a kernel of even size, made of random
+# factors so that it is neither symmetric nor centered.
+def get_separable_kernel(kind, get_kernels):
+    if kind == "gaussian":
+        return get_kernels(kind)
+    generator = torch.Generator().manual_seed(0)
+    u = torch.rand(5, generator=generator, dtype=torch.float64)
+    v = torch.rand(4, generator=generator, dtype=torch.float64)
+    kernel = torch.outer(u, v)
+    return (kernel / kernel.sum())[None, None]
+
+
+@pytest.mark.parametrize("kind", ["gaussian", "even"])
+@pytest.mark.parametrize("shape", [SHAPE, (1, 3, 13, 32)])
+def test_separable_conv_matches_fft(kind, shape, get_images, get_kernels):
+    kernel = get_separable_kernel(kind, get_kernels)
+    physics = BlurV2(kernel)
+    separable = BlurV2(kernel, separable=True)
+    x = get_images(shape, seed=0)
+    assert separable.uses_separable_conv(x)
+    assert torch.allclose(separable.A(x), physics.A(x), rtol=0, atol=1e-12)
+    assert torch.allclose(
+        separable.A_adjoint(x), physics.A_adjoint(x), rtol=0, atol=1e-12
+    )
+
+
+@pytest.mark.parametrize("kind", ["asymmetric", "bank"])
+def test_non_separable_kernels_use_the_fft(kind, get_kernels):
+    assert BlurV2(get_kernels(kind), separable=True).factors is None
+
+
+# NOTE: The sizes of the images aren't multiples of the tile size, the
+# asymmetric kernel has an even size, and the halo of the Gaussian kernel
+# (13x13) is almost as large as the smaller tiles.
+@pytest.mark.parametrize("kind", KINDS)
+@pytest.mark.parametrize("tile_size, workers", [(16, 1), (16, 3), (8, 2)])
+def test_tiled_matches_untiled(kind, tile_size, workers, get_images, get_kernels):
+    kernel = get_kernels(kind)
+    physics = BlurV2(kernel)
+    tiled = BlurV2(kernel, tile_size=tile_size, tile_workers=workers)
+    x = get_images((3, 2, 37, 29), seed=0)
+    assert tiled.uses_tiling(x)
+    assert torch.allclose(tiled.A(x), physics.A(x), rtol=0, atol=1e-12)
+    assert torch.allclose(
+        tiled.A_adjoint(x), physics.A_adjoint(x), rtol=0, atol=1e-12
+    )
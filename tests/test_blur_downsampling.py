@@ -0,0 +1,57 @@
+import pytest
+import torch
+from deepinv.optim.utils import conjugate_gradient
+
+from physics.blur import BlurV2
+from physics.blur_downsampling import BlurDownsampling
+
+# NOTE: The sizes (H, W) of the images are multiples of the rates.
+CASES = [
+    ("gaussian", 2, (24, 18)),
+    ("gaussian", 4, (32, 24)),
+    ("asymmetric", 2, (20, 16)),
+    ("asymmetric", 3, (21, 27)),
+]
+
+
+@pytest.mark.parametrize("kind, rate, size", CASES)
+def test_matches_blur_then_decimation(kind, rate, size, get_images, get_kernels):
+    kernel = get_kernels(kind)
+    physics = BlurDownsampling(kernel, rate=rate)
+    x = get_images((2, 3, *size), seed=0)
+    y = BlurV2(kernel).A(x)[..., ::rate, ::rate]
+    assert torch.allclose(physics.A(x), y, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("kind, rate, size", CASES)
+def test_dagger_is_a_right_inverse(kind, rate, size, get_images, get_kernels):
+    physics = BlurDownsampling(get_kernels(kind), rate=rate)
+    y = physics.A(get_images((2, 3, *size), seed=0))
+    x = physics.A_dagger(y, eps=0)
+    assert x.shape[-2:] == size
+    assert torch.allclose(physics.A(x), y, rtol=0, atol=1e-8)
+
+
+# NOTE: The proximal operator of 1/2 ||Ax - y||^2 with step gamma solves
+# (A^T A + I / gamma) x = A^T y + z / gamma.
+@pytest.mark.parametrize("kind, rate, size", CASES)
+def test_prox_l2_matches_conjugate_gradient(
+    kind, rate, size, get_images, get_kernels
+):
+    physics = BlurDownsampling(get_kernels(kind), rate=rate)
+    z = get_images((2, 3, *size), seed=1)
+    y = physics.A(get_images((2, 3, *size), seed=2))
+    gamma = 0.5
+    x = physics.prox_l2(z, y, gamma)
+
+    # the images are solved one by one as the batched dot products of
+    # conjugate_gradient don't broadcast
+    for i in range(z.shape[0]):
+        b = physics.A_adjoint(y[i : i + 1]) + z[i : i + 1] / gamma
+        x_cg = conjugate_gradient(
+            lambda v: physics.A_adjoint(physics.A(v)) + v / gamma,
+            b,
+            max_iter=1000,
+            tol=1e-12,
+        )
+        assert torch.allclose(x[i : i + 1], x_cg, rtol=0, atol=1e-6)
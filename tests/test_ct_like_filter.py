@@ -0,0 +1,50 @@
+import pytest
+import torch
+
+from physics.ct_like_filter import CTLikeFilter
+
+
+# NOTE: This is the former implementation, which filters the columns and the
+# rows one after the other, and it is the reference of the current one.
+def filter1d(x, dim, eps, inverse):
+    x = x.swapaxes(dim, -1)
+    n = x.shape[-1]
+    x = torch.fft.rfft(x, dim=-1)
+    otf = torch.arange(x.shape[-1], device=x.device).to(dtype=x.dtype)
+    otf = otf + eps
+    if inverse:
+        otf = 1 / otf
+    x = x * otf.expand(x.shape)
+    x = torch.fft.irfft(x, dim=-1, n=n)
+    return x.swapaxes(dim, -1)
+
+
+def reference_A(x, eps):
+    x = filter1d(x, dim=2, eps=eps, inverse=True)
+    return filter1d(x, dim=3, eps=eps, inverse=True)
+
+
+def reference_A_dagger(y, eps):
+    y = filter1d(y, dim=2, eps=eps, inverse=False)
+    return filter1d(y, dim=3, eps=eps, inverse=False)
+
+
+SHAPES = [(2, 3, 16, 16), (2, 3, 17, 17), (1, 3, 16, 21), (1, 1, 15, 22)]
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("eps", [1, 0.5])
+def test_matches_the_two_pass_filter(shape, eps, get_images):
+    physics = CTLikeFilter(eps=eps)
+    x = get_images(shape, seed=0)
+    assert torch.allclose(physics.A(x), reference_A(x, eps), rtol=0, atol=1e-12)
+    assert torch.allclose(
+        physics.A_dagger(x), reference_A_dagger(x, eps), rtol=0, atol=1e-10
+    )
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_dagger_inverts_the_operator(shape, get_images):
+    physics = CTLikeFilter()
+    x = get_images(shape, seed=0)
+    assert torch.allclose(physics.A_dagger(physics.A(x)), x, rtol=0, atol=1e-10)
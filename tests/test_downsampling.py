@@ -0,0 +1,31 @@
+import pytest
+import torch
+
+from physics.downsampling import Downsampling
+
+# NOTE: The sizes (H, W) of the images include sizes which aren't multiples
+# of the rate.
+CASES = [
+    (2, (16, 12)),
+    (2, (17, 13)),
+    (3, (18, 21)),
+    (3, (20, 16)),
+    (4, (16, 24)),
+    (4, (19, 22)),
+]
+
+
+@pytest.mark.parametrize("rate, size", CASES)
+def test_dagger_is_a_right_inverse(rate, size, get_images):
+    physics = Downsampling(rate=rate, antialias=True, true_adjoint=True)
+    y = get_images(physics.A(get_images((2, 3, *size), seed=0)).shape, seed=1)
+    x = physics.A_dagger(y, shape=(2, 3, *size))
+    assert x.shape[-2:] == size
+    assert torch.allclose(physics.A(x), y, rtol=0, atol=1e-8)
+
+
+def test_default_size_is_a_multiple_of_the_rate(get_images):
+    physics = Downsampling(rate=2, antialias=True, true_adjoint=True)
+    y = get_images((1, 3, 8, 6), seed=1)
+    assert physics.A_adjoint(y).shape[-2:] == (16, 12)
+    assert torch.equal(physics.A_adjoint(y), physics.A_adjoint(y, shape=(16, 12)))
@@ -0,0 +1,46 @@
+import pytest
+import torch
+import torch.nn.functional as F
+
+import physics.blur
+from physics.blur import conv, conv_transpose
+
+
+# NOTE: This is the former implementation, which filters the channels of the
+# images one by one, and it is the reference of depthwise_conv. The output
+# used to be allocated in float32 whatever the dtype of the images.
+def per_slice_conv(x, filter, transpose=False):
+    fn = F.conv_transpose2d if transpose else F.conv2d
+    b, c = x.shape[:2]
+    y = None
+    for i in range(b):
+        if filter.shape[0] > 1:
+            f = filter[i : i + 1]
+        else:
+            f = filter
+        for j in range(c):
+            y_ij = fn(x[i, j].unsqueeze(0).unsqueeze(1), f)
+            if y is None:
+                y = torch.zeros((b, c, *y_ij.shape[-2:]), device=x.device)
+            y[i, j] = y_ij[0, 0]
+    return y
+
+
+PADDINGS = ["valid", "circular", "reflect", "replicate"]
+
+
+@pytest.mark.parametrize("kind", ["gaussian", "asymmetric", "bank"])
+@pytest.mark.parametrize("padding", PADDINGS)
+def test_matches_the_per_slice_loops(
+    kind, padding, get_images, get_kernels, monkeypatch
+):
+    kernels = get_kernels(kind).to(torch.float32)
+    x = get_images((3, 2, 20, 17), seed=0).to(torch.float32)
+    y = conv(x, kernels, padding)
+    x_adjoint = conv_transpose(x, kernels, padding)
+
+    monkeypatch.setattr(physics.blur, "depthwise_conv", per_slice_conv)
+    assert torch.allclose(y, conv(x, kernels, padding), rtol=1e-5, atol=1e-6)
+    assert torch.allclose(
+        x_adjoint, conv_transpose(x, kernels, padding), rtol=1e-5, atol=1e-6
+    )
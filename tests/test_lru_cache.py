@@ -0,0 +1,46 @@
+import copy
+import pickle
+import torch
+
+from lru_cache import LRUCache, get_tensor_key
+from physics.blur import BlurV2
+from physics.kernels import get_kernel
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = LRUCache(2)
+    builds = []
+
+    def build(key):
+        builds.append(key)
+        return key * 10
+
+    assert cache.get(1, lambda: build(1)) == 10
+    assert cache.get(2, lambda: build(2)) == 20
+    assert cache.get(1, lambda: build(1)) == 10
+    assert cache.get(3, lambda: build(3)) == 30
+    # 2 is the least recently used entry
+    assert cache.get(2, lambda: build(2)) == 20
+    assert builds == [1, 2, 3, 2]
+    assert cache.get_stats() == {"hits": 1, "misses": 4, "entries": 2}
+
+
+def test_tensor_keys():
+    a = get_tensor_key(torch.Size([4, 5]), torch.float32, "cpu")
+    b = get_tensor_key((4, 5), torch.float32, torch.device("cpu"))
+    assert a == b
+    assert a != get_tensor_key((4, 5), torch.float64, "cpu")
+
+
+def test_copies_start_out_empty():
+    physics = BlurV2(get_kernel("Gaussian_R2").unsqueeze(0).unsqueeze(0))
+    x = torch.rand(1, 3, 16, 16)
+    y = physics.A(x)
+    other = copy.deepcopy(physics)
+    assert other.get_cache_stats()["entries"] == 0
+    assert torch.equal(other.A(x), y)
+    assert other.otf_cache.lock is not physics.otf_cache.lock
+
+    cache = pickle.loads(pickle.dumps(physics.otf_cache))
+    assert cache.max_size == physics.otf_cache.max_size
+    assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,40 @@
+import pytest
+import torch
+
+from rng import seeded_randn_window
+
+
+@pytest.mark.parametrize("location", [(0, 0), (5, 7), (60, 30), (64, 128)])
+@pytest.mark.parametrize("size", [(1, 1), (16, 24), (70, 90)])
+def test_window_matches_crop(location, size):
+    shape = (1, 3, 200, 300)
+    noise = seeded_randn_window(
+        shape, seed=3, device="cpu", dtype=torch.float32, tile_size=64
+    )
+    i, j = location
+    h, w = size
+    window = seeded_randn_window(
+        (1, 3, h, w),
+        seed=3,
+        device="cpu",
+        dtype=torch.float32,
+        tile_size=64,
+        location=location,
+    )
+    assert torch.equal(window, noise[..., i : i + h, j : j + w])
+
+
+def test_noise_does_not_depend_on_image_size():
+    kwargs = dict(seed=5, device="cpu", dtype=torch.float64, tile_size=32)
+    small = seeded_randn_window((3, 40, 50), **kwargs)
+    large = seeded_randn_window((3, 100, 70), **kwargs)
+    assert torch.equal(small, large[..., :40, :50])
+
+
+def test_noise_depends_on_seed():
+    kwargs = dict(device="cpu", dtype=torch.float32, tile_size=16)
+    a = seeded_randn_window((3, 40, 40), seed=0, **kwargs)
+    b = seeded_randn_window((3, 40, 40), seed=1, **kwargs)
+    assert not torch.equal(a, b)
+    # the tiles of a same noise are independent
+    assert not torch.equal(a[..., :16, :16], a[..., :16, 16:32])